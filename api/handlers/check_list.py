@@ -1,6 +1,7 @@
 import uuid
 from datetime import timezone as dt_timezone
 
+from asgiref.sync import sync_to_async
 from django.http import HttpResponseRedirect, Http404
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
@@ -9,29 +10,52 @@ import logging
 from ..api_app import acl_api
 from ..schemas.check_list_colback import CheckListColback
 from check_list.models import Dashboard, CheckListItem, CheckEvents
+from check_list.event_cache import aget_event_url
+from check_list.write_behind import enqueue_check, enqueue_callback
 
 logger = logging.getLogger(__name__)
 
 
+async def _abuffer(enqueue, *args) -> bool:
+    """Кладёт обновление в write-behind буфер. False — буфер недоступен, нужно писать в БД напрямую."""
+    try:
+        await sync_to_async(enqueue)(*args)
+        return True
+    except Exception as e:
+        logger.warning(f"Event updates buffer unavailable, writing directly: {str(e)}")
+        return False
+
+
 @acl_api.post("/dashbord_colback/")
-def get_check_list(request, payload: CheckListColback):
+async def get_check_list(request, payload: CheckListColback):
     """
     Обработка колбэка от фронтенда.
     Фронтенд присылает event_uuid как hex-строку, здесь приводим её к UUID.
+    Событие обновляется одним UPDATE без предварительного чтения.
+    Для свежих событий (есть в кэше редиректов, значит событие существует) результат
+    кладётся в write-behind буфер и записывается в БД пачкой.
     """
     try:
         event_uuid = uuid.UUID(payload.event_uuid)
-        event = CheckEvents.objects.get(uuid=event_uuid)
         # Приводим время из колбэка (UTC) к таймзоне приложения (Europe/Moscow)
         if payload.date_time:
             dt = payload.date_time
             if timezone.is_naive(dt):
                 dt = timezone.make_aware(dt, dt_timezone.utc)
-            event.button_click_time = timezone.localtime(dt)
+            button_click_time = timezone.localtime(dt)
         else:
-            event.button_click_time = None # при отсутствии времени считаем, что кнопка не нажата
-        event.no_problem = not payload.problem  # реверс логики для базы: фронт отправляет problem=True при проблеме
-        event.save(update_fields=["button_click_time", "no_problem"])
+            button_click_time = None # при отсутствии времени считаем, что кнопка не нажата
+        no_problem = not payload.problem  # реверс логики для базы: фронт отправляет problem=True при проблеме
+        buffered = await aget_event_url(event_uuid) and await _abuffer(
+            enqueue_callback, event_uuid, button_click_time, no_problem
+        )
+        if not buffered:
+            updated = await CheckEvents.objects.filter(uuid=event_uuid).aupdate(
+                button_click_time=button_click_time,
+                no_problem=no_problem,
+            )
+            if not updated:
+                raise CheckEvents.DoesNotExist
         logger.info(f"Event {payload.event_uuid} marked as {'problem' if payload.problem else 'ok'}")
         logger.info(f"Button click time: {payload.date_time}, Problem: {payload.problem}")
         return {"status": "success"}
@@ -47,27 +71,41 @@ def get_check_list(request, payload: CheckListColback):
 
 
 @acl_api.get("/to_dashboard/{event_uuid}/")
-def to_dashboard(request, event_uuid: str):
+async def to_dashboard(request, event_uuid: str):
     """
     Фронтенд/переход по ссылке использует hex-строку UUID.
     Здесь приводим её к UUID для поиска в базе.
+    Первый переход помечает событие просмотренным одним условным UPDATE (WHERE checked=false),
+    URL дашборда читается одним запросом по первичному ключу события.
+    Свежие события обслуживаются из кэша Redis без обращения к БД: отметка о переходе
+    кладётся в write-behind буфер и записывается в БД пачкой.
     """
     try:
         real_uuid = uuid.UUID(event_uuid)
-        event = CheckEvents.objects.get(uuid=real_uuid)
-        if not event.checked:
-            event.checked = True
-            event.check_time = timezone.now()
-            event.save(update_fields=["checked", "check_time"])
-            logger.info(f"Event {event_uuid} marked as checked, redirecting to {event.dashboard.url}")
+        cached_url = await aget_event_url(real_uuid)
+        if cached_url and await _abuffer(enqueue_check, real_uuid, timezone.now()):
+            logger.info(f"Event {event_uuid} redirect served from cache, redirecting to {cached_url}")
+            return HttpResponseRedirect(cached_url)
+
+        marked = await CheckEvents.objects.filter(uuid=real_uuid, checked=False).aupdate(
+            checked=True,
+            check_time=timezone.now(),
+        )
+        dashboard_url = await (
+            CheckEvents.objects.filter(uuid=real_uuid)
+            .values_list("dashboard__url", flat=True)
+            .aget()
+        )
+        if marked:
+            logger.info(f"Event {event_uuid} marked as checked, redirecting to {dashboard_url}")
         else:
-            logger.info(f"Event {event_uuid} already checked, redirecting to {event.dashboard.url}")
+            logger.info(f"Event {event_uuid} already checked, redirecting to {dashboard_url}")
 
-        if not event.dashboard.url:
-            logger.error(f"Dashboard {event.dashboard.uid} has no URL")
+        if not dashboard_url:
+            logger.error(f"Dashboard for event {event_uuid} has no URL")
             return {"status": "error", "message": "Dashboard URL not configured"}, 500
 
-        return HttpResponseRedirect(event.dashboard.url)
+        return HttpResponseRedirect(dashboard_url)
     except (ValueError, TypeError):
         logger.error(f"Invalid event UUID format in redirect: {event_uuid}")
         raise Http404("Invalid event UUID")
@@ -0,0 +1,58 @@
+import logging
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from ..api_app import lh_api
+from api.schemas.lighthouse.metrics_schemas import MetricSeries, ErrorResponse
+from lighthouse.metrics import METRIC_FIELDS, get_series
+from lighthouse.models import Source
+
+logger = logging.getLogger(__name__)
+
+# Период по умолчанию и ограничение числа точек ряда
+DEFAULT_PERIOD = timedelta(days=7)
+MAX_POINTS = 2000
+
+
+@lh_api.get(
+    "/sources/{source_id}/metrics/{metric}/",
+    response={200: MetricSeries, 400: ErrorResponse, 404: ErrorResponse},
+)
+def get_metric_series(
+    request,
+    source_id: int,
+    metric: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    points: int = 500,
+):
+    """
+    Ряд метрики Lighthouse источника за [start, end) (по умолчанию — последние 7 дней; время без
+    часового пояса — в TIME_ZONE проекта), прорежённый до points точек: сырые прогоны, часовые или дневные агрегаты (min, медиана, p95).
+    """
+    if metric not in METRIC_FIELDS:
+        return 400, {"status": "error", "message": f"Unknown metric, expected one of: {', '.join(METRIC_FIELDS)}"}
+    if not 1 <= points <= MAX_POINTS:
+        return 400, {"status": "error", "message": f"points must be between 1 and {MAX_POINTS}"}
+    # Время без часового пояса считается временем TIME_ZONE проекта
+    if end is not None and timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if start is not None and timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    end = end or timezone.now()
+    start = start or end - DEFAULT_PERIOD
+    if start >= end:
+        return 400, {"status": "error", "message": "start must be earlier than end"}
+    if not Source.objects.filter(pk=source_id).exists():
+        return 404, {"status": "error", "message": "Source not found"}
+
+    resolution, series = get_series(source_id, metric, start, end, points)
+    return 200, {
+        "source_id": source_id,
+        "metric": metric,
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "points": series,
+    }
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Literal
+
+from ninja import Schema
+
+
+class MetricPoint(Schema):
+    """Точка ряда: начало интервала и агрегаты метрики за него (для сырых прогонов min = median = p95)."""
+
+    t: datetime
+    count: int
+    min: float
+    median: float
+    p95: float
+
+
+class MetricSeries(Schema):
+    source_id: int
+    metric: str
+    resolution: Literal["raw", "hour", "day"]
+    start: datetime
+    end: datetime
+    points: list[MetricPoint]
+
+
+class ErrorResponse(Schema):
+    status: str
+    message: str
@@ -1,56 +1,122 @@
 from typing import Any
-from httpx import Client
+from importlib.util import find_spec
 
-from config.settings import REDASH_API_KEY, REDASH_BASE_URL
+import httpx
+
+from config.settings import (
+    REDASH_API_KEY,
+    REDASH_BASE_URL,
+    REDASH_TIMEOUT,
+    REDASH_CONNECT_TIMEOUT,
+    REDASH_MAX_CONNECTIONS,
+    REDASH_MAX_KEEPALIVE,
+    REDASH_HTTP2,
+)
+from config.utils.http import get_http_client
 
 from api.schemas.redash.redash_schemas import StartJobBody, StartSQLQueryBody, JobStatusResponse, JobResponse
 
 
+def _client_kwargs() -> dict[str, Any]:
+    return {
+        "timeout": httpx.Timeout(REDASH_TIMEOUT, connect=REDASH_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(max_connections=REDASH_MAX_CONNECTIONS, max_keepalive_connections=REDASH_MAX_KEEPALIVE),
+        "http2": REDASH_HTTP2 and find_spec("h2") is not None,
+    }
+
+
+def get_redash_http_client() -> httpx.Client:
+    """
+    Общий для процесса HTTP-клиент Redash (keep-alive пул, пересоздаётся после fork).
+    HTTP/2 включается только если установлен пакет h2.
+    """
+    return get_http_client("redash", **_client_kwargs())
+
+
+def normalize_job_status(job_resp: JobStatusResponse) -> JobStatusResponse:
+    """В ответе jobs API query_result_id может приходить как result (int) — переносим его в query_result_id."""
+    job = job_resp.job
+    if job.query_result_id is None and isinstance(job.result, int):
+        return JobStatusResponse(job=job.model_copy(update={"query_result_id": job.result}))
+    return job_resp
+
+
+def _with_result(job_resp: JobStatusResponse, data: dict) -> JobStatusResponse:
+    # GET /api/query_results/{id} возвращает { "query_result": { "data": { "rows": [...] }, ... } },
+    # а не { "job": { ... } } — подставляем тело ответа в job.result для совместимости с вызывающим кодом
+    return JobStatusResponse(
+        job=JobResponse(
+            id=job_resp.job.id,
+            updated_at=0,
+            status=job_resp.job.status or 0,
+            error=job_resp.job.error,
+            result=data,
+            query_result_id=job_resp.job.query_result_id,
+        )
+    )
+
+
 class RedashClient:
     def __init__(self, api_key: str | None = None, base_url: str | None = None):
         self.api_key = api_key if api_key else REDASH_API_KEY
         self.base_url = base_url if base_url else REDASH_BASE_URL
 
-    def start_dashboard_query(self, body: StartJobBody) -> JobStatusResponse:
-        url = f"{self.base_url}/api/queries/{body.id}/results"
+    def _request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
         headers = {"Authorization": f"Key {self.api_key}"}
-
-        response = Client().post(url, headers=headers, json=body.model_dump(exclude_none=True))
+        response = get_redash_http_client().request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
         response.raise_for_status()
+        return response
+
+    def start_dashboard_query(self, body: StartJobBody) -> JobStatusResponse:
+        response = self._request("POST", f"/api/queries/{body.id}/results", json=body.model_dump(exclude_none=True))
         return JobStatusResponse.model_validate(response.json())
 
     def get_query_status(self, job_resp: JobStatusResponse) -> JobStatusResponse:
-        url = f"{self.base_url}/api/jobs/{job_resp.job.id}"
-        headers = {"Authorization": f"Key {self.api_key}"}
-        response = Client().get(url, headers=headers)
-        response.raise_for_status()
+        response = self._request("GET", f"/api/jobs/{job_resp.job.id}")
         return JobStatusResponse.model_validate(response.json())
 
     def get_query_result(self, job_resp: JobStatusResponse) -> JobStatusResponse:
         if not job_resp.job.query_result_id:
             raise ValueError("Query result ID is missing in the job response.")
-        url = f"{self.base_url}/api/query_results/{job_resp.job.query_result_id}"
-        headers = {"Authorization": f"Key {self.api_key}"}
-        response = Client().get(url, headers=headers)
-        response.raise_for_status()
-        # GET /api/query_results/{id} возвращает { "query_result": { "data": { "rows": [...] }, ... } },
-        # а не { "job": { ... } } — подставляем тело ответа в job.result для совместимости с вызывающим кодом
-        data = response.json()
-        return JobStatusResponse(
-            job=JobResponse(
-                id=job_resp.job.id,
-                updated_at=0,
-                status=job_resp.job.status or 0,
-                error=job_resp.job.error,
-                result=data,
-                query_result_id=job_resp.job.query_result_id,
-            )
-        )
+        response = self._request("GET", f"/api/query_results/{job_resp.job.query_result_id}")
+        return _with_result(job_resp, response.json())
 
     def run_sql_query(self, body: StartSQLQueryBody) -> JobStatusResponse:
-        url = f"{self.base_url}/api/query_results"
+        response = self._request("POST", "/api/query_results", json=body.model_dump(exclude_none=True))
+        return JobStatusResponse.model_validate(response.json())
+
+
+class AsyncRedashClient:
+    """
+    Асинхронный клиент Redash для одновременного опроса многих джобов (redash.poller).
+    Пул соединений живёт до выхода из async with: event loop создаётся на каждый опрос.
+    """
+
+    def __init__(self, api_key: str | None = None, base_url: str | None = None):
+        self.api_key = api_key if api_key else REDASH_API_KEY
+        self.base_url = base_url if base_url else REDASH_BASE_URL
+        self._client: httpx.AsyncClient | None = None
+
+    async def __aenter__(self) -> "AsyncRedashClient":
+        self._client = httpx.AsyncClient(**_client_kwargs())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._client.aclose()
+        self._client = None
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
         headers = {"Authorization": f"Key {self.api_key}"}
-        response = Client().post(url, headers=headers, json=body.model_dump(exclude_none=True))
+        response = await self._client.request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
         response.raise_for_status()
-        return JobStatusResponse.model_validate(response.json())
+        return response
+
+    async def get_query_status(self, job_id: str) -> JobStatusResponse:
+        response = await self._request("GET", f"/api/jobs/{job_id}")
+        return normalize_job_status(JobStatusResponse.model_validate(response.json()))
 
+    async def get_query_result(self, job_resp: JobStatusResponse) -> JobStatusResponse:
+        if not job_resp.job.query_result_id:
+            raise ValueError("Query result ID is missing in the job response.")
+        response = await self._request("GET", f"/api/query_results/{job_resp.job.query_result_id}")
+        return _with_result(job_resp, response.json())
@@ -21,10 +21,10 @@ class DashboardAdmin(admin.ModelAdmin):
 
 @admin.register(CheckEvents)
 class CheckEventsAdmin(admin.ModelAdmin):
-    list_display = ('uuid', 'dashboard', 'event_time_with_seconds', 'check_time_with_seconds', 'button_click_time_with_seconds', 'checked', 'no_problem')
+    list_display = ('uuid', 'dashboard', 'event_time_with_seconds', 'check_time_with_seconds', 'button_click_time_with_seconds', 'checked', 'no_problem', 'deadline_at', 'escalated_at')
     list_filter = ('checked', 'no_problem', 'event_time')
     search_fields = ('dashboard__name', 'dashboard__uid', 'uuid')
-    readonly_fields = ('uuid', 'event_time')
+    readonly_fields = ('uuid', 'event_time', 'deadline_at', 'escalated_at')
     date_hierarchy = 'event_time'
     actions = [export_checkevents_to_excel]
     ordering = ['-event_time']
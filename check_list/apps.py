@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CheckListConfig(AppConfig):
     name = 'check_list'
+
+    def ready(self):
+        # Публикация изменений расписаний для планировщика run_scheduler (utils.scheduler)
+        from utils.scheduler import connect_signals
+        connect_signals()
@@ -0,0 +1,98 @@
+"""
+Серверный контроль сроков проверки дашбордов.
+
+При создании события dispatch_due_items проставляет CheckEvents.deadline_at = время создания
++ Dashboard.time_for_check. Периодическая задача escalate_overdue_events находит просроченные
+непроверенные события одним запросом по частичному индексу checkevents_overdue_idx
+(в индексе только checked=false и escalated_at is null), проставляет escalated_at и отправляет
+их в бот пачкой — повторно событие не эскалируется.
+
+Отправка идёт через тот же эндпоинт бота, что и рассылка дашбордов (SEND_MESSAGE_ENDPOINT):
+просроченное событие уходит повторным сообщением о дашборде с пометкой о просрочке и той же
+ссылкой-счётчиком, с time_for_check=0 — бот не заводит таймер для уже просроченного события. HTTP-запрос выполняется после коммита транзакции, без удержания блокировок;
+если бот не принял пачку, escalated_at снимается и события попадут в следующий проход.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from config.settings import DJANGO_EXTERNAL_URL
+from utils.claim import supports_skip_locked
+
+from check_list.utils.text_format import markdownv2_to_html
+from .models import CheckEvents
+from .delivery import post_dashboards
+from .pydantic_models import DashboardModel
+from .settings import OVERDUE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def deadline_for(created_at, time_for_check: int | None):
+    """Срок проверки события; None, если время на проверку не задано."""
+    if not time_for_check or time_for_check <= 0:
+        return None
+    return created_at + timedelta(minutes=time_for_check)
+
+
+def overdue_queryset(now):
+    return CheckEvents.objects.filter(
+        checked=False,
+        escalated_at__isnull=True,
+        deadline_at__lte=now,
+    )
+
+
+def build_overdue_payload(event: CheckEvents) -> dict:
+    """Сообщение о просроченном событии в формате рассылки дашбордов (DashboardModel)."""
+    dashboard = event.dashboard
+    deadline = timezone.localtime(event.deadline_at).strftime("%d.%m.%Y %H:%M")
+    return DashboardModel(
+        event_uuid=event.uuid.hex,
+        dashboard_uid=dashboard.uid,
+        name=f"Просрочена проверка: {markdownv2_to_html(dashboard.name)}",
+        description=f"Срок проверки истёк {deadline}",
+        real_url=dashboard.url,
+        fake_url=f"http://{DJANGO_EXTERNAL_URL}/acl_api/to_dashboard/{event.uuid.hex}/",
+        # Срок уже истёк и отслеживается сервером: боту не нужно запускать новый таймер
+        time_for_check=0,
+        deadline_at=event.deadline_at,
+    ).model_dump(mode="json")
+
+
+def escalate_batch(now, batch_size: int = OVERDUE_BATCH_SIZE) -> int:
+    """
+    Эскалирует одну пачку просроченных событий. Возвращает размер пачки.
+
+    События захватываются (SKIP LOCKED там, где поддерживается) и помечаются escalated_at в короткой
+    транзакции; отправка в бот — после коммита. При ошибке отправки отметка снимается, а ошибка пробрасывается.
+    """
+    with transaction.atomic():
+        queryset = overdue_queryset(now).select_related("dashboard").order_by("deadline_at")
+        if supports_skip_locked(queryset.db):
+            queryset = queryset.select_for_update(skip_locked=True, of=("self",))
+        events = list(queryset[:batch_size])
+        if not events:
+            return 0
+        pks = [event.pk for event in events]
+        CheckEvents.objects.filter(pk__in=pks).update(escalated_at=now)
+
+    try:
+        post_dashboards([build_overdue_payload(event) for event in events])
+    except Exception:
+        CheckEvents.objects.filter(pk__in=pks, escalated_at=now).update(escalated_at=None)
+        raise
+    return len(events)
+
+
+def escalate_overdue(now=None) -> int:
+    """Эскалирует все просроченные на момент now события пачками. Возвращает их количество."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        escalated = escalate_batch(now)
+        total += escalated
+        if escalated < OVERDUE_BATCH_SIZE:
+            return total
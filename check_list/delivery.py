@@ -0,0 +1,86 @@
+"""
+Доставка дашбордов в телеграм-бот.
+
+Список дашбордов режется на пачки по TELEGRAM_CHUNK_SIZE, каждая пачка отправляется
+отдельно через общий keep-alive пул соединений и повторяется независимо от остальных.
+Состояние доставки хранится на CheckEvents (delivery_status, delivery_attempts, delivered_at):
+при повторе пачки уже доставленные события не отправляются, поэтому частичный сбой
+не приводит ни к дублям в чате, ни к переотправке всего списка.
+"""
+import uuid
+import logging
+
+import httpx
+from django.db.models import F
+from django.utils import timezone
+
+from config.utils.http import get_http_client
+
+from .models import CheckEvents
+from .settings import TELEGRAM_URL, SEND_MESSAGE_ENDPOINT, TELEGRAM_CHUNK_SIZE, TELEGRAM_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+def get_telegram_client() -> httpx.Client:
+    """Общий для процесса HTTP-клиент телеграм-бота."""
+    return get_http_client(
+        "telegram",
+        timeout=httpx.Timeout(TELEGRAM_TIMEOUT),
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+    )
+
+
+def chunked(dashboards: list[dict], size: int = TELEGRAM_CHUNK_SIZE) -> list[list[dict]]:
+    """Режет список дашбордов на пачки не больше size."""
+    size = max(size, 1)
+    return [dashboards[i:i + size] for i in range(0, len(dashboards), size)]
+
+
+def _event_uuids(dashboards: list[dict]) -> list[uuid.UUID]:
+    return [uuid.UUID(dash["event_uuid"]) for dash in dashboards]
+
+
+def filter_undelivered(dashboards: list[dict]) -> list[dict]:
+    """Убирает из пачки дашборды, события которых уже доставлены в бот."""
+    delivered = {
+        event_uuid.hex
+        for event_uuid in CheckEvents.objects.filter(
+            uuid__in=_event_uuids(dashboards),
+            delivery_status=CheckEvents.DELIVERY_SENT,
+        ).values_list("uuid", flat=True)
+    }
+    return [dash for dash in dashboards if dash["event_uuid"] not in delivered]
+
+
+def post_dashboards(dashboards: list[dict]) -> httpx.Response:
+    """Отправляет одну пачку дашбордов в бот. Ошибки HTTP пробрасываются."""
+    url = f"http://{TELEGRAM_URL}{SEND_MESSAGE_ENDPOINT}"
+    response = get_telegram_client().post(url=url, json={"dashboards": dashboards})
+    response.raise_for_status()
+    return response
+
+
+def mark_delivered(dashboards: list[dict]) -> None:
+    CheckEvents.objects.filter(uuid__in=_event_uuids(dashboards)).update(
+        delivery_status=CheckEvents.DELIVERY_SENT,
+        delivery_attempts=F("delivery_attempts") + 1,
+        delivered_at=timezone.now(),
+    )
+
+
+def mark_attempt_failed(dashboards: list[dict], final: bool) -> None:
+    updates = {"delivery_attempts": F("delivery_attempts") + 1}
+    if final:
+        updates["delivery_status"] = CheckEvents.DELIVERY_FAILED
+    CheckEvents.objects.filter(uuid__in=_event_uuids(dashboards)).exclude(
+        delivery_status=CheckEvents.DELIVERY_SENT
+    ).update(**updates)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Сетевые ошибки, 429 и 5xx повторяем; остальные 4xx — ошибка в данных, повтор не поможет."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
@@ -0,0 +1,100 @@
+"""
+Движок отправки дашбордов на проверку.
+
+Выбирает готовые к проверке элементы чек-листа одним запросом (фильтр по start_at в SQL),
+создаёт события CheckEvents одним bulk_create и сдвигает start_at одним bulk_update —
+всё в рамках одной транзакции. Количество запросов к БД не зависит от числа элементов.
+
+Элементы захватываются через utils.claim, поэтому параллельные тики beat и несколько
+воркеров не отправят один и тот же элемент дважды.
+"""
+import uuid
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from config.settings import DJANGO_EXTERNAL_URL
+from utils.claim import claim_due, release_lease, LEASE_FIELDS
+from utils.scheduler import notify_changed
+
+from check_list.utils.text_format import markdownv2_to_html
+from .models import CheckListItem, CheckEvents
+from .event_cache import cache_event_urls
+from .deadlines import deadline_for
+from .pydantic_models import DashboardModel
+
+logger = logging.getLogger(__name__)
+
+
+def build_dashboard_payload(item: CheckListItem, event: CheckEvents) -> dict:
+    """
+    Формирует модель дашборда для отправки в телеграм-бот.
+    Внешнему миру (телеграм-боту) отдаём hex-значение UUID, т.к. фронтенд работает с такими строками.
+    """
+    dashboard = item.dashboard
+    return DashboardModel(
+        event_uuid=event.uuid.hex,
+        dashboard_uid=dashboard.uid,
+        name=markdownv2_to_html(dashboard.name),
+        description=markdownv2_to_html(item.description) if item.description else "",
+        real_url=dashboard.url,
+        fake_url=f"http://{DJANGO_EXTERNAL_URL}/acl_api/to_dashboard/{event.uuid.hex}/",
+        time_for_check=dashboard.time_for_check,
+        # Срок проверки считается на сервере; просрочку отслеживает check_list.deadlines
+        deadline_at=event.deadline_at,
+    ).model_dump(mode="json")
+
+
+def dispatch_due_items(now=None) -> list[dict]:
+    """
+    Находит элементы чек-листа, готовые к проверке, создаёт по ним события
+    и обновляет время следующего запуска.
+
+    Returns:
+        список дашбордов (DashboardModel в виде dict) для отправки в телеграм-бот.
+    """
+    now = now or timezone.now()
+    dashboards_to_send = []
+    events = []
+    items_to_update = []
+    schedule_memo = {}  # следующий запуск crontab считается один раз на расписание
+
+    with transaction.atomic():
+        items = claim_due(
+            CheckListItem.objects.filter(is_active=True, start_at__lte=now)
+            .select_related("dashboard", "interval", "crontab")
+            .order_by("start_at"),
+            now,
+        )
+        for item in items:
+            release_lease(item)
+            items_to_update.append(item)
+            try:
+                event = CheckEvents(
+                    uuid=uuid.uuid4(),
+                    dashboard=item.dashboard,
+                    deadline_at=deadline_for(now, item.dashboard.time_for_check),
+                )
+                dash = build_dashboard_payload(item, event)
+                next_run = item.get_next_run(now, schedule_memo)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке элемента чек-листа {item.id}: {str(e)}")
+                continue
+
+            events.append(event)
+            dashboards_to_send.append(dash)
+            if next_run:
+                item.start_at = next_run
+            logger.info(f"Подготовлен дашборд {item.dashboard.name} (event {event.uuid}) для отправки")
+
+        if events:
+            CheckEvents.objects.bulk_create(events)
+            # Редиректы по новым событиям обслуживаются из кэша (после коммита, когда события уже в БД)
+            redirects = [(event.uuid, event.dashboard.url, event.dashboard.time_for_check) for event in events]
+            transaction.on_commit(lambda: cache_event_urls(redirects))
+        if items_to_update:
+            CheckListItem.objects.bulk_update(items_to_update, ["start_at", *LEASE_FIELDS])
+            notify_changed("check_list", [item.pk for item in items_to_update])
+
+    return dashboards_to_send
@@ -0,0 +1,46 @@
+"""
+Горячий кэш редиректов event_uuid → URL дашборда в Redis (кэш Django).
+
+Соответствие записывается при создании событий в dispatch_due_items и не меняется,
+поэтому эндпоинт to_dashboard отдаёт редирект из кэша, не обращаясь к БД.
+TTL записи равен Dashboard.time_for_check; после его истечения редирект обслуживается из БД.
+Ошибки Redis не пробрасываются: при недоступном кэше работает обычный путь через БД.
+"""
+import uuid
+import logging
+from collections import defaultdict
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def event_cache_key(event_uuid: uuid.UUID) -> str:
+    return f"check_list:event_url:{event_uuid.hex}"
+
+
+def cache_event_urls(events: list[tuple[uuid.UUID, str, int]]) -> None:
+    """
+    Кладёт в кэш URL дашбордов созданных событий.
+
+    Args:
+        events: список (uuid события, URL дашборда, время на проверку в минутах)
+    """
+    by_ttl: dict[int, dict[str, str]] = defaultdict(dict)
+    for event_uuid, url, time_for_check in events:
+        if url and time_for_check and time_for_check > 0:
+            by_ttl[time_for_check * 60][event_cache_key(event_uuid)] = url
+    try:
+        for ttl, mapping in by_ttl.items():
+            cache.set_many(mapping, timeout=ttl)
+    except Exception as e:
+        logger.warning("Failed to cache event redirect URLs: %s", e)
+
+
+async def aget_event_url(event_uuid: uuid.UUID) -> str | None:
+    """Возвращает URL дашборда события из кэша или None, если записи нет или кэш недоступен."""
+    try:
+        return await cache.aget(event_cache_key(event_uuid))
+    except Exception as e:
+        logger.warning("Failed to read event redirect URL from cache: %s", e)
+        return None
@@ -0,0 +1,41 @@
+"""
+Долгоживущий планировщик: держит элементы расписаний всех доменов (check_list, lighthouse,
+redash dashboards, redash SQLs) в min-heap по start_at и ставит задачи отправки точно в срок.
+"""
+import time
+import logging
+
+import redis
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from utils.scheduler import HeapScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Запуск планировщика на min-heap (вместо поминутного опроса таблиц расписаний в beat)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reconnect-delay",
+            type=float,
+            default=5.0,
+            help="Пауза в секундах перед переподключением к Redis или БД при обрыве соединения",
+        )
+
+    def handle(self, *args, **options):
+        reconnect_delay = options["reconnect_delay"]
+        self.stdout.write(self.style.SUCCESS("Планировщик запущен"))
+        while True:
+            try:
+                HeapScheduler().run_forever()
+            except redis.ConnectionError as e:
+                logger.warning("Scheduler lost Redis connection: %s, reconnecting in %ss", e, reconnect_delay)
+                time.sleep(reconnect_delay)
+            except DatabaseError as e:
+                # Разорванное соединение закрывается, следующий запрос откроет новое; куча перезагружается
+                logger.warning("Scheduler database error: %s, reconnecting in %ss", e, reconnect_delay)
+                close_old_connections()
+                time.sleep(reconnect_delay)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('check_list', '0041_checklistitem_lease_token_checklistitem_lease_until'),
+    ]
+
+    operations = [
+        # Уже существующие события считаем доставленными
+        migrations.AddField(
+            model_name='checkevents',
+            name='delivery_status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Не удалось отправить')], default='sent', max_length=16),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='checkevents',
+            name='delivery_status',
+            field=models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Не удалось отправить')], default='pending', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='checkevents',
+            name='delivery_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='checkevents',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
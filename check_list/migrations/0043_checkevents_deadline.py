@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('check_list', '0042_checkevents_delivery'),
+    ]
+
+    operations = [
+        # Для существующих событий срок не проставляется — по истории эскалации не отправляются
+        migrations.AddField(
+            model_name='checkevents',
+            name='deadline_at',
+            field=models.DateTimeField(blank=True, help_text='Срок, до которого дашборд должен быть проверен', null=True),
+        ),
+        migrations.AddField(
+            model_name='checkevents',
+            name='escalated_at',
+            field=models.DateTimeField(blank=True, help_text='Время отправки уведомления о просрочке', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='checkevents',
+            index=models.Index(condition=models.Q(('checked', False), ('escalated_at__isnull', True)), fields=['deadline_at'], name='checkevents_overdue_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('check_list', '0043_checkevents_deadline'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='checkevents',
+            name='event_time',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -1,6 +1,5 @@
 from logging import Logger
 
-from datetime import timedelta
 from django.utils import timezone
 from django.db import models
 
@@ -8,6 +7,8 @@ from django_celery_beat.models import IntervalSchedule, CrontabSchedule
 from celery.schedules import crontab as celery_crontab
 
 from config.utils.time import default_start_at
+from config.utils.schedule import next_run_at
+from config.utils.retention import RetentionPolicy
 
 logger = Logger(__name__)
 
@@ -50,6 +51,9 @@ class CheckListItem(models.Model):
     is_active = models.BooleanField(default=True)
     start_at = models.DateTimeField(default=default_start_at,
                                     help_text="Время запуска задачи. (по стандарту через 5 минут от текущего времени)")
+    # Аренда строки воркером при захвате (используется на БД без SELECT ... FOR UPDATE SKIP LOCKED, см. utils.claim)
+    lease_token = models.UUIDField(null=True, blank=True, editable=False)
+    lease_until = models.DateTimeField(null=True, blank=True, editable=False)
     class Meta:
         verbose_name = "Элемент расписания чек листа"
         verbose_name_plural = "Элементы расписания чек листа"
@@ -57,27 +61,21 @@ class CheckListItem(models.Model):
             ("can_switch_active_status", "Может переключать статус активности"),
         ]
 
+    def get_next_run(self, now=None, memo: dict | None = None):
+        """
+        Возвращает время следующего запуска задачи, не сохраняя его.
+        Если расписание не задано — возвращает None.
+        """
+        return next_run_at(self, now, memo)
+
     def set_next_run(self):
         """
         Задает следующий интервал запуска задачи.
         """
-        if self.interval:
-            schedule = self.interval
-            delta = timedelta(**{schedule.period: schedule.every})
-            if delta:
-                self.start_at += delta
-                self.save(update_fields=["start_at"])
-        
-        elif self.crontab:
-            schedule = self.crontab
-            celery_cron = schedule.schedule
-            now_in_cron_tz = timezone.now().astimezone(schedule.timezone)
-            next_time = celery_cron.remaining_estimate(now_in_cron_tz)
-            if next_time:
-                self.start_at = timezone.now() + next_time
-                self.save(update_fields=["start_at"])
-        else:
-            logger.warning(f"CheckListItem {self.id} has no interval or crontab schedule set.")
+        next_run = self.get_next_run()
+        if next_run:
+            self.start_at = next_run
+            self.save(update_fields=["start_at"])
 
     def __str__(self):
         return self.description
@@ -94,15 +92,44 @@ class CheckEvents(models.Model):
         on_delete=models.CASCADE,
         related_name='history_dashboards'
     )
-    event_time = models.DateTimeField(auto_now_add=True)
+    event_time = models.DateTimeField(auto_now_add=True, db_index=True)
     check_time = models.DateTimeField(null=True, blank=True)
     button_click_time = models.DateTimeField(null=True, blank=True)
     no_problem = models.BooleanField(default=True)
     checked = models.BooleanField(default=False)
 
+    # Состояние доставки события в телеграм-бот (см. check_list.delivery)
+    DELIVERY_PENDING = "pending"
+    DELIVERY_SENT = "sent"
+    DELIVERY_FAILED = "failed"
+    DELIVERY_STATUSES = [
+        (DELIVERY_PENDING, "Ожидает отправки"),
+        (DELIVERY_SENT, "Отправлено"),
+        (DELIVERY_FAILED, "Не удалось отправить"),
+    ]
+    delivery_status = models.CharField(max_length=16, choices=DELIVERY_STATUSES, default=DELIVERY_PENDING)
+    delivery_attempts = models.PositiveSmallIntegerField(default=0)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    # Срок проверки (время создания + Dashboard.time_for_check) и время эскалации просрочки (см. check_list.deadlines)
+    deadline_at = models.DateTimeField(null=True, blank=True, help_text="Срок, до которого дашборд должен быть проверен")
+    escalated_at = models.DateTimeField(null=True, blank=True, help_text="Время отправки уведомления о просрочке")
+
+    # Хранение истории (см. utils.clean): события старше 90 дней удаляются
+    retention = RetentionPolicy("event_time", days=90, overridable=True)
+
     class Meta:
         verbose_name = "История чек листа"
         verbose_name_plural = "Истории чек листа"
+        indexes = [
+            # Частичный индекс: в нём только непроверенные и ещё не эскалированные события,
+            # поэтому поиск просрочки не зависит от размера истории
+            models.Index(
+                fields=["deadline_at"],
+                name="checkevents_overdue_idx",
+                condition=models.Q(checked=False, escalated_at__isnull=True),
+            ),
+        ]
 
     def event_time_with_seconds(self):
         if self.event_time is None:
@@ -124,11 +151,3 @@ class CheckEvents(models.Model):
 
     def __str__(self):
         return f"History for {self.dashboard.name} at {self.event_time}"
-
-    def clear_old(self, days: int = 90):
-        """
-        Очищает старые запросы, которые были созданы более days (по дефолту 90) дней назад.
-        """
-        if self.event_time < (timezone.now() - timezone.timedelta(days=days)):
-            self.delete()
-
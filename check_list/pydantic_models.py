@@ -1,4 +1,6 @@
 import uuid
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -15,5 +17,6 @@ class DashboardModel(BaseModel):
     real_url: str
     fake_url: str
     time_for_check: int
+    deadline_at: datetime | None = None  # срок проверки, считается на сервере
 
 
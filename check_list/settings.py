@@ -4,3 +4,17 @@ import os
 # В Docker для доступа к боту на хосте используйте host.docker.internal:8001
 TELEGRAM_URL = os.environ.get("TELEGRAM_URL", "localhost:8001")
 SEND_MESSAGE_ENDPOINT = "/api/checks/send"
+
+# Доставка дашбордов в бота: размер пачки в одном запросе, таймаут запроса (сек) и число повторов пачки
+TELEGRAM_CHUNK_SIZE = int(os.environ.get("TELEGRAM_CHUNK_SIZE", "20"))
+TELEGRAM_TIMEOUT = float(os.environ.get("TELEGRAM_TIMEOUT", "10"))
+TELEGRAM_MAX_RETRIES = int(os.environ.get("TELEGRAM_MAX_RETRIES", "5"))
+
+# Write-behind буфер обновлений CheckEvents (переходы по ссылке и колбэки бота):
+# буфер сбрасывается в БД через EVENT_UPDATES_FLUSH_DELAY секунд после первой записи
+# или сразу, как только в нём накопится EVENT_UPDATES_FLUSH_SIZE записей
+EVENT_UPDATES_FLUSH_DELAY = float(os.environ.get("EVENT_UPDATES_FLUSH_DELAY", "0.3"))
+EVENT_UPDATES_FLUSH_SIZE = int(os.environ.get("EVENT_UPDATES_FLUSH_SIZE", "200"))
+
+# Эскалация просроченных проверок (через SEND_MESSAGE_ENDPOINT): размер пачки событий в одном запросе
+OVERDUE_BATCH_SIZE = int(os.environ.get("OVERDUE_BATCH_SIZE", "100"))
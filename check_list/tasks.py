@@ -1,17 +1,14 @@
-import uuid
 import httpx
 import logging
 from config.celery import app
-from django.utils import timezone
 
-from config.settings import DJANGO_EXTERNAL_URL
-from .settings import TELEGRAM_URL, SEND_MESSAGE_ENDPOINT
+from .settings import TELEGRAM_URL, SEND_MESSAGE_ENDPOINT, TELEGRAM_MAX_RETRIES
+from .dispatch import dispatch_due_items
+from . import write_behind
+from .deadlines import escalate_overdue
+from .delivery import chunked, filter_undelivered, post_dashboards, mark_delivered, mark_attempt_failed, is_retryable
 
-from check_list.utils.text_format import markdownv2_to_html
-from .models import CheckListItem, CheckEvents
-from .pydantic_models import DashboardModel
-
-from utils.clean import run_clear_old_task  # Регистрация таски очистки по всем моделям с clear_old
+from utils.clean import run_clear_old_task  # Регистрация таски очистки по всем моделям с политикой хранения
 from utils.uteka.uteka import run_uteka_price_task, run_uteka_share_task  # noqa: F401 — регистрация тасок Ютека
 
 logger = logging.getLogger(__name__)
@@ -20,48 +17,10 @@ logger = logging.getLogger(__name__)
 def start_send_dashboard_notification():
     """
     Периодическая задача для проверки и отправки дашбордов на проверку.
-    Проверяет все активные элементы чек-листа и отправляет те, которые готовы к проверке.
+    Выбирает активные элементы чек-листа, готовые к проверке, и отправляет их в телеграм бот.
     """
     try:
-        # Получаем все активные элементы чек-листа
-        items = CheckListItem.objects.filter(
-            is_active=True
-        )
-
-        dashboards_to_send = []
-        for item in items:
-            # Проверяем, пора ли отправлять дашборд
-            if item.start_at <= timezone.now():
-                try:
-                    # Создаем событие проверки дашборда
-                    event = CheckEvents.objects.create(
-                        uuid=uuid.uuid4(),
-                        dashboard=item.dashboard,
-                    )
-                    # Добавляем модель дашборда для отправки
-                    # Внешнему миру (телеграм-боту) отдаём hex-значение UUID, т.к. фронтенд работает с такими строками.
-                    dash = DashboardModel(
-                            event_uuid=event.uuid.hex,
-                            dashboard_uid=item.dashboard.uid,
-                            name=markdownv2_to_html(item.dashboard.name),
-                            description=markdownv2_to_html(item.description) if item.description else "",
-                            real_url=item.dashboard.url,
-                            fake_url=f"http://{DJANGO_EXTERNAL_URL}/acl_api/to_dashboard/{event.uuid.hex}/",
-                            # TODO: Сейчас время для проверки борда считается на стороне фронтенда, нужно 
-                            # переделать что бы это считалось на стороне сервера. 
-                            # 
-                            time_for_check=item.dashboard.time_for_check,
-                        ).model_dump(mode="json")
-                    logger.info(f"{dash}")
-                    dashboards_to_send.append(
-                        dash
-                    )
-                    # Обновляем время следующего запуска
-                    item.set_next_run()
-                    logger.info(f"Подготовлен дашборд {item.dashboard.name} (event {event.uuid}) для отправки")
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке элемента чек-листа {item.id}: {str(e)}")
-                    continue
+        dashboards_to_send = dispatch_due_items()
 
         if dashboards_to_send:
             # Вызываем задачу отправки дашбордов
@@ -76,28 +35,70 @@ def start_send_dashboard_notification():
 def send_dashboard_notification(dashboards_to_send: list[dict]):
     """
     Отправляет список дашбордов на проверку в телеграм бот.
-    Обрабатывает ошибки подключения и таймауты.
+    Список режется на пачки, каждая пачка отправляется и повторяется отдельной задачей.
+    """
+    chunks = chunked(dashboards_to_send)
+    for chunk in chunks:
+        send_dashboard_chunk.delay(chunk)
+    logger.info(f"Отправка {len(dashboards_to_send)} дашбордов в телеграм бот разбита на {len(chunks)} пач(ек)")
+
+
+@app.task(bind=True, max_retries=TELEGRAM_MAX_RETRIES)
+def send_dashboard_chunk(self, dashboards: list[dict]):
+    """
+    Отправляет одну пачку дашбордов в телеграм бот.
+    При сетевых ошибках, 429 и 5xx повторяет пачку с экспоненциальной задержкой;
+    уже доставленные события при повторе не отправляются.
     """
     url = f"http://{TELEGRAM_URL}{SEND_MESSAGE_ENDPOINT}"
+    pending = filter_undelivered(dashboards)
+    if not pending:
+        logger.info("Все дашборды пачки уже доставлены в телеграм бот")
+        return
+
     try:
-        logger.info(f"Отправка {len(dashboards_to_send)} дашбордов в телеграм бот по адресу {url}")
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(
-                url=url,
-                json={"dashboards": dashboards_to_send}
-            )
-            response.raise_for_status()
-            logger.info(f"Дашборды успешно отправлены в телеграм бот. Ответ: {response.status_code}")
-    except httpx.TimeoutException:
-        logger.error(f"Таймаут при отправке дашбордов в телеграм бот по адресу {url}")
-        raise
-    except httpx.ConnectError as e:
-        logger.error(f"Ошибка соединения при отправке дашбордов в телеграм бот по адресу {url}: {str(e)}")
-        raise
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Ошибка HTTP {e.response.status_code} при отправке дашбордов в телеграм бот: {e.response.text}")
-        raise
+        response = post_dashboards(pending)
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка при отправке дашбордов в телеграм бот: {str(e)}", exc_info=True)
+        if isinstance(e, httpx.TimeoutException):
+            logger.error(f"Таймаут при отправке дашбордов в телеграм бот по адресу {url}")
+        elif isinstance(e, httpx.ConnectError):
+            logger.error(f"Ошибка соединения при отправке дашбордов в телеграм бот по адресу {url}: {str(e)}")
+        elif isinstance(e, httpx.HTTPStatusError):
+            logger.error(f"Ошибка HTTP {e.response.status_code} при отправке дашбордов в телеграм бот: {e.response.text}")
+        else:
+            logger.error(f"Непредвиденная ошибка при отправке дашбордов в телеграм бот: {str(e)}", exc_info=True)
+
+        retry = is_retryable(e) and self.request.retries < self.max_retries
+        mark_attempt_failed(pending, final=not retry)
+        if retry:
+            countdown = min(2 ** self.request.retries * 5, 300)
+            raise self.retry(exc=e, countdown=countdown)
         raise
 
+    mark_delivered(pending)
+    logger.info(f"{len(pending)} дашбордов успешно отправлены в телеграм бот. Ответ: {response.status_code}")
+
+
+@app.task
+def flush_check_event_updates():
+    """
+    Сбрасывает в БД накопленные в write-behind буфере отметки о переходах по ссылкам
+    и колбэки бота (пачкой в одной транзакции, условными UPDATE только изменяемых полей).
+    """
+    updated = write_behind.flush()
+    if updated:
+        logger.info(f"Из буфера записано обновлений событий: {updated}")
+
+
+@app.task
+def escalate_overdue_events():
+    """
+    Периодическая задача: отправляет в телеграм бот события, не проверенные к сроку deadline_at.
+    Каждое событие эскалируется один раз.
+    """
+    try:
+        escalated = escalate_overdue()
+        if escalated:
+            logger.info(f"Отправлено уведомлений о просроченных проверках: {escalated}")
+    except Exception as e:
+        logger.error(f"Ошибка в escalate_overdue_events: {str(e)}", exc_info=True)
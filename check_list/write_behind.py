@@ -0,0 +1,160 @@
+"""
+Write-behind буфер обновлений CheckEvents.
+
+Переходы по ссылке (check_time/checked) и колбэки бота (button_click_time/no_problem)
+не пишутся в БД по одному: эндпоинты кладут их в список Redis, а задача
+flush_check_event_updates забирает накопленное и применяет пачкой в одной транзакции.
+Сброс ставится через EVENT_UPDATES_FLUSH_DELAY после первой записи в пустой буфер
+или сразу при накоплении EVENT_UPDATES_FLUSH_SIZE записей; в очереди Celery одновременно
+не больше одного сброса (флаг FLUSH_SCHEDULED_KEY, SET NX).
+
+Пачка применяется двумя UPDATE (переходы и колбэки) со значениями по событиям через CASE WHEN pk.
+Каждый UPDATE меняет только свои поля и условно, как и прямая запись из эндпоинтов:
+переход — WHERE checked=false (фиксируется первый), колбэк — только button_click_time/no_problem.
+Поэтому параллельные сбросы и прямые записи не затирают друг друга.
+Если применить пачку не удалось, её записи возвращаются в начало буфера.
+"""
+import json
+import uuid
+import logging
+from datetime import datetime
+
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+
+from config.utils.redis import get_redis
+
+from .models import CheckEvents
+from .settings import EVENT_UPDATES_FLUSH_DELAY, EVENT_UPDATES_FLUSH_SIZE
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = "check_list:event_updates"
+FLUSH_SCHEDULED_KEY = "check_list:event_updates:flush_scheduled"
+# Сколько записей забирать из буфера за один шаг сброса
+DRAIN_BATCH = 1000
+
+UPDATE_CHECK = "check"
+UPDATE_CALLBACK = "callback"
+
+
+def _enqueue(record: dict) -> None:
+    # Импорт здесь: tasks импортирует этот модуль
+    from .tasks import flush_check_event_updates
+
+    redis = get_redis()
+    length = redis.rpush(BUFFER_KEY, json.dumps(record))
+    # Флаг снимает сам сброс перед чтением буфера; срок — страховка, если задача потерялась
+    if redis.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=max(int(EVENT_UPDATES_FLUSH_DELAY) + 5, 5)):
+        if length >= EVENT_UPDATES_FLUSH_SIZE:
+            flush_check_event_updates.delay()
+        else:
+            flush_check_event_updates.apply_async(countdown=EVENT_UPDATES_FLUSH_DELAY)
+
+
+def enqueue_check(event_uuid: uuid.UUID, check_time: datetime) -> None:
+    """Откладывает отметку о переходе по ссылке дашборда."""
+    _enqueue({"uuid": event_uuid.hex, "kind": UPDATE_CHECK, "check_time": check_time.isoformat()})
+
+
+def enqueue_callback(event_uuid: uuid.UUID, button_click_time: datetime | None, no_problem: bool) -> None:
+    """Откладывает запись результата проверки из колбэка бота."""
+    _enqueue({
+        "uuid": event_uuid.hex,
+        "kind": UPDATE_CALLBACK,
+        "button_click_time": button_click_time.isoformat() if button_click_time else None,
+        "no_problem": no_problem,
+    })
+
+
+def _drain(limit: int) -> list[str]:
+    """Атомарно забирает из буфера до limit записей (в исходном виде)."""
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.lrange(BUFFER_KEY, 0, limit - 1)
+    pipe.ltrim(BUFFER_KEY, limit, -1)
+    raw, _ = pipe.execute()
+    return raw
+
+
+def _restore(raw: list[str]) -> None:
+    """Возвращает забранные записи в начало буфера в прежнем порядке."""
+    if raw:
+        get_redis().lpush(BUFFER_KEY, *reversed(raw))
+
+
+def _parse(raw: list[str]) -> list[dict]:
+    records = []
+    for item in raw:
+        try:
+            records.append(json.loads(item))
+        except (TypeError, ValueError):
+            logger.warning("Invalid record in event updates buffer: %r", item)
+    return records
+
+
+def apply_updates(records: list[dict]) -> int:
+    """
+    Применяет записи буфера к CheckEvents в одной транзакции: один UPDATE для переходов и один для колбэков.
+    Переход по ссылке фиксируется только первый (UPDATE ... WHERE checked=false, как и при прямой записи),
+    из колбэков события применяется последний. Каждое обновление пишет только свои поля.
+    Возвращает количество обновлённых строк.
+    """
+    checks: dict[uuid.UUID, datetime] = {}
+    callbacks: dict[uuid.UUID, dict] = {}
+    for record in records:
+        event_uuid = uuid.UUID(record["uuid"])
+        if record["kind"] == UPDATE_CHECK:
+            check_time = datetime.fromisoformat(record["check_time"])
+            if event_uuid not in checks or check_time < checks[event_uuid]:
+                checks[event_uuid] = check_time
+        elif record["kind"] == UPDATE_CALLBACK:
+            callbacks[event_uuid] = record
+
+    updated = 0
+    with transaction.atomic():
+        if checks:
+            updated += CheckEvents.objects.filter(pk__in=checks, checked=False).update(
+                checked=True,
+                check_time=Case(
+                    *[When(pk=event_uuid, then=Value(check_time)) for event_uuid, check_time in checks.items()],
+                    output_field=models.DateTimeField(),
+                ),
+            )
+        if callbacks:
+            click_times = {}
+            for event_uuid, record in callbacks.items():
+                click_time = record.get("button_click_time")
+                click_times[event_uuid] = datetime.fromisoformat(click_time) if click_time else None
+            count = CheckEvents.objects.filter(pk__in=callbacks).update(
+                button_click_time=Case(
+                    *[When(pk=event_uuid, then=Value(click_time)) for event_uuid, click_time in click_times.items()],
+                    output_field=models.DateTimeField(),
+                ),
+                no_problem=Case(
+                    *[When(pk=event_uuid, then=Value(record["no_problem"])) for event_uuid, record in callbacks.items()],
+                    output_field=models.BooleanField(),
+                ),
+            )
+            if count < len(callbacks):
+                found = set(CheckEvents.objects.filter(pk__in=callbacks).values_list("pk", flat=True))
+                for event_uuid in callbacks.keys() - found:
+                    logger.warning(f"Event {event_uuid} from updates buffer not found")
+            updated += count
+    return updated
+
+
+def flush(max_batches: int = 50) -> int:
+    """Сбрасывает буфер в БД пачками по DRAIN_BATCH записей. Возвращает число выполненных обновлений."""
+    get_redis().delete(FLUSH_SCHEDULED_KEY)
+    updated = 0
+    for _ in range(max_batches):
+        raw = _drain(DRAIN_BATCH)
+        if not raw:
+            break
+        try:
+            updated += apply_updates(_parse(raw))
+        except Exception:
+            # Записи не теряются: следующий сброс применит их снова (обновления идемпотентны)
+            _restore(raw)
+            raise
+    return updated
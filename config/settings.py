@@ -170,6 +170,20 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
+# Redis для служебных нужд приложения (pub/sub планировщика и т.п.). По умолчанию — брокер Celery.
+REDIS_URL = os.environ.get("REDIS_URL", CELERY_BROKER_URL)
+
+# Кэш Django в Redis (горячие данные, например event_uuid → URL дашборда для редиректа)
+REDIS_CACHE_URL = os.environ.get("REDIS_CACHE_URL", REDIS_URL)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_CACHE_URL,
+        "KEY_PREFIX": "acl",
+        "OPTIONS": {"socket_connect_timeout": 1, "socket_timeout": 1},
+    }
+}
+
 # Lighthouse → ELK (опционально): если заданы, результаты Lighthouse отправляются в ELK
 ELK_URL = os.environ.get("ELK_URL")  # например https://10.222.0.3:9200/runner-vm-bots-logs/_doc/
 ELK_INDEX_TEMPLATE = os.environ.get("ELK_INDEX_TEMPLATE", "lighthouse-results-%Y-%m-%d")  # шаблон для индекса, поддерживает strftime
@@ -177,10 +191,57 @@ ELK_USER = os.environ.get("ELK_USER")
 ELK_PASSWORD = os.environ.get("ELK_PASSWORD")
 ELK_AUTH = os.environ.get("ELK_AUTH")  # пароль при использовании ELK_USER по умолчанию
 ELK_VERIFY_SSL = os.environ.get("ELK_VERIFY_SSL", "false").lower() == "true"
+# Очередь отправки в ELK (lighthouse.elk): документов в одном запросе _bulk, таймаут запроса, сек,
+# и сколько раз повторять документ, который ELK не принял
+ELK_BULK_SIZE = int(os.environ.get("ELK_BULK_SIZE", "500"))
+ELK_TIMEOUT = float(os.environ.get("ELK_TIMEOUT", "30"))
+ELK_MAX_ATTEMPTS = int(os.environ.get("ELK_MAX_ATTEMPTS", "10"))
+
+# Lighthouse: пул постоянных браузеров Chromium в каждом процессе воркера (0 — запуск браузера на каждый прогон)
+LIGHTHOUSE_BROWSER_POOL_SIZE = int(os.environ.get("LIGHTHOUSE_BROWSER_POOL_SIZE", "1"))
+# Одновременные прогоны Lighthouse на хост (0 — по числу ядер и памяти), ядер и памяти (МБ) на прогон,
+# каталог файловых блокировок слотов и через сколько секунд повторить задачу, если свободного слота нет
+LIGHTHOUSE_MAX_CONCURRENCY = int(os.environ.get("LIGHTHOUSE_MAX_CONCURRENCY", "0"))
+LIGHTHOUSE_CPUS_PER_RUN = int(os.environ.get("LIGHTHOUSE_CPUS_PER_RUN", "2"))
+LIGHTHOUSE_MEMORY_PER_RUN_MB = int(os.environ.get("LIGHTHOUSE_MEMORY_PER_RUN_MB", "1024"))
+LIGHTHOUSE_SLOT_DIR = os.environ.get("LIGHTHOUSE_SLOT_DIR", "/tmp/lighthouse-slots")
+LIGHTHOUSE_SLOT_RETRY_SECONDS = int(os.environ.get("LIGHTHOUSE_SLOT_RETRY_SECONDS", "30"))
+# Лимиты процесса Lighthouse и его Chrome (lighthouse.supervisor): память (МБ) и ядра через дочерний cgroup v2
+# (LIGHTHOUSE_CGROUP_ROOT — делегированный cgroup, по умолчанию cgroup воркера), без cgroup — RLIMIT_CPU
+# и, если задан, RLIMIT_AS (МБ)
+LIGHTHOUSE_MEMORY_LIMIT_MB = int(os.environ.get("LIGHTHOUSE_MEMORY_LIMIT_MB", "2048"))
+LIGHTHOUSE_CPU_LIMIT = float(os.environ.get("LIGHTHOUSE_CPU_LIMIT", "2"))
+LIGHTHOUSE_CGROUP_ROOT = os.environ.get("LIGHTHOUSE_CGROUP_ROOT", "")
+LIGHTHOUSE_RLIMIT_AS_MB = int(os.environ.get("LIGHTHOUSE_RLIMIT_AS_MB", "0"))
+# Кэш результатов Lighthouse по конфигурации прогона (url, заголовки, режим эмуляции): сколько секунд
+# результат считается свежим (0 — без кэша) и через сколько секунд блокировка одновременного прогона той же
+# конфигурации считается брошенной
+LIGHTHOUSE_RESULT_CACHE_SECONDS = int(os.environ.get("LIGHTHOUSE_RESULT_CACHE_SECONDS", "300"))
+LIGHTHOUSE_RESULT_WAIT_SECONDS = int(os.environ.get("LIGHTHOUSE_RESULT_WAIT_SECONDS", "300"))
+# Детектор регрессий Lighthouse: окно последних прогонов (по нему считается p75), вес нового значения в EWMA
+# базовой линии, сколько значений нужно в базовой линии до первых уведомлений, порог роста (доля)
+# и через сколько часов повторять уведомление о не исправленной регрессии
+LIGHTHOUSE_REGRESSION_WINDOW = int(os.environ.get("LIGHTHOUSE_REGRESSION_WINDOW", "5"))
+LIGHTHOUSE_REGRESSION_ALPHA = float(os.environ.get("LIGHTHOUSE_REGRESSION_ALPHA", "0.1"))
+LIGHTHOUSE_REGRESSION_MIN_BASELINE = int(os.environ.get("LIGHTHOUSE_REGRESSION_MIN_BASELINE", "10"))
+LIGHTHOUSE_REGRESSION_THRESHOLD = float(os.environ.get("LIGHTHOUSE_REGRESSION_THRESHOLD", "0.2"))
+LIGHTHOUSE_REGRESSION_COOLDOWN_HOURS = float(os.environ.get("LIGHTHOUSE_REGRESSION_COOLDOWN_HOURS", "6"))
 
 # Redash configuration
 REDASH_API_KEY = os.environ.get("REDASH_API_KEY")
 REDASH_BASE_URL = os.environ.get("REDASH_BASE_URL")
+# Общий пул соединений к Redash (api.wrappers.redash): таймауты запроса и подключения, сек, размер пула
+# и число keep-alive соединений; HTTP/2 используется, только если установлен пакет h2
+REDASH_TIMEOUT = float(os.environ.get("REDASH_TIMEOUT", "30"))
+REDASH_CONNECT_TIMEOUT = float(os.environ.get("REDASH_CONNECT_TIMEOUT", "10"))
+REDASH_MAX_CONNECTIONS = int(os.environ.get("REDASH_MAX_CONNECTIONS", "20"))
+REDASH_MAX_KEEPALIVE = int(os.environ.get("REDASH_MAX_KEEPALIVE", "10"))
+REDASH_HTTP2 = os.environ.get("REDASH_HTTP2", "True") == "True"
+# Сколько джобов Redash опрашивать одновременно в refresh_all_requests
+REDASH_POLL_CONCURRENCY = int(os.environ.get("REDASH_POLL_CONCURRENCY", "10"))
+# Задержка опроса джоба Redash: REDASH_POLL_INITIAL_DELAY * 2^попытка, не больше REDASH_POLL_MAX_DELAY, сек
+REDASH_POLL_INITIAL_DELAY = float(os.environ.get("REDASH_POLL_INITIAL_DELAY", "2"))
+REDASH_POLL_MAX_DELAY = float(os.environ.get("REDASH_POLL_MAX_DELAY", "300"))
 
 # Naumen configuration
 NAUMEN_BASE_URL = os.environ.get("NAUMEN_BASE_URL")
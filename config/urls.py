@@ -18,9 +18,11 @@ from django.contrib import admin
 from django.urls import path
 from api.api_app import acl_api
 from api.api_app import oe_api
+from api.api_app import lh_api
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("acl_api/", acl_api.urls), # acl - auto check list
     path("oe_api/", oe_api.urls), # oe - order errors
+    path("lh_api/", lh_api.urls), # lh - lighthouse metrics
 ]
@@ -0,0 +1,34 @@
+import os
+import threading
+
+import httpx
+
+_clients: dict[str, httpx.Client] = {}
+_clients_pid: int | None = None
+_lock = threading.Lock()
+
+
+def get_http_client(name: str, **client_kwargs) -> httpx.Client:
+    """
+    Возвращает общий для процесса httpx.Client с keep-alive пулом соединений.
+
+    Клиенты хранятся по имени (один пул на внешний сервис) и переиспользуются между
+    вызовами задач Celery. После fork (prefork-воркеры Celery) пулы создаются заново,
+    чтобы дочерний процесс не делил сокеты с родителем.
+
+    Args:
+        name: имя клиента (например "telegram")
+        client_kwargs: параметры httpx.Client (timeout, limits, verify, ...), применяются при создании
+    """
+    global _clients_pid
+    pid = os.getpid()
+    with _lock:
+        if _clients_pid != pid:
+            # Сокеты родителя не закрываем: они принадлежат ему
+            _clients.clear()
+            _clients_pid = pid
+        client = _clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.Client(**client_kwargs)
+            _clients[name] = client
+        return client
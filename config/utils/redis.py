@@ -0,0 +1,23 @@
+import os
+
+import redis
+from django.conf import settings
+
+_client: redis.Redis | None = None
+_client_pid: int | None = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Возвращает общий клиент Redis (REDIS_URL) для текущего процесса.
+    После fork (prefork-воркеры Celery) клиент создаётся заново, чтобы не делить сокеты с родителем.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=1,
+            health_check_interval=30,
+        )
+        _client_pid = os.getpid()
+    return _client
@@ -0,0 +1,119 @@
+"""
+Декларативное хранение (retention) истории.
+
+Модель объявляет политику атрибутом класса:
+
+    retention = RetentionPolicy("event_time", days=90)
+
+Дополнительное условие condition (Q) сужает удаляемые строки, например только неиспользуемые:
+
+    retention = RetentionPolicy("last_used_at", days=1, condition=Q(requests__isnull=True))
+
+Срок можно переопределить при запуске очистки (purge_all): словарь {'app_label.model_name': days}
+задаёт срок отдельным моделям, а одно число применяется только к моделям с overridable=True.
+Так общий days из расписания очистки не сокращает, например, годовую историю метрик.
+
+purge_model удаляет строки старше срока пачками по диапазонам первичного ключа:
+DELETE ... WHERE <date_field> < cutoff AND pk > a AND pk <= b. Строки не загружаются в память
+(если у модели нет сигналов удаления и каскадов), количество удалённых берётся из результата DELETE.
+Поле даты должно быть проиндексировано.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.apps import apps
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк удалять одним DELETE
+DELETE_CHUNK_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Поле даты, по которому определяется возраст строки, срок хранения по умолчанию в днях,
+    необязательное дополнительное условие на удаляемые строки и действует ли на модель
+    общий срок, переданный в purge_all одним числом.
+    """
+
+    date_field: str
+    days: int
+    condition: Q | None = None
+    overridable: bool = False
+
+
+def get_models_with_retention() -> list:
+    """Возвращает модели, у которых объявлена политика хранения."""
+    return [model for model in apps.get_models() if isinstance(getattr(model, "retention", None), RetentionPolicy)]
+
+
+def purge_model(model, days: int | None = None, now=None, chunk_size: int = DELETE_CHUNK_SIZE) -> int:
+    """
+    Удаляет строки модели старше days дней (по умолчанию — срок из политики модели).
+    Возвращает количество удалённых строк модели (без каскадно удалённых строк других моделей).
+    """
+    policy: RetentionPolicy = model.retention
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=policy.days if days is None else days)
+    expired = model._default_manager.filter(**{f"{policy.date_field}__lt": cutoff})
+    if policy.condition is not None:
+        expired = expired.filter(policy.condition)
+
+    deleted = 0
+    lower = None
+    while True:
+        chunk = expired if lower is None else expired.filter(pk__gt=lower)
+        # Верхняя граница диапазона — chunk_size-й по порядку pk среди устаревших строк
+        upper = list(chunk.order_by("pk").values_list("pk", flat=True)[chunk_size - 1:chunk_size])
+        if upper:
+            chunk = chunk.filter(pk__lte=upper[0])
+        _, per_model = chunk.delete()
+        deleted += per_model.get(model._meta.label, 0)
+        if not upper:
+            return deleted
+        lower = upper[0]
+
+
+def _days_for(model, label: str, days: int | dict[str, int] | None) -> int | None:
+    """Переопределённый срок для модели или None (срок из политики)."""
+    if isinstance(days, dict):
+        return days.get(label)
+    if days is not None and model.retention.overridable:
+        return days
+    return None
+
+
+def purge_all(days: int | dict[str, int] | None = None, now=None) -> dict[str, int]:
+    """
+    Применяет политики хранения ко всем моделям.
+    days — словарь {'app_label.model_name': срок} для отдельных моделей или одно число для моделей
+    с overridable=True; остальные модели используют срок из своей политики.
+    Возвращает словарь { 'app_label.model_name': количество удалённых записей } (-1 при ошибке).
+    """
+    now = now or timezone.now()
+    models = get_models_with_retention()
+    if days is not None and not isinstance(days, dict):
+        ignored = [model._meta.label_lower for model in models if not model.retention.overridable]
+        if ignored:
+            logger.warning(
+                "Общий срок хранения %s дн. не применяется к моделям %s (срок из политики; "
+                "задайте словарь {'app_label.model_name': дни}, чтобы переопределить)",
+                days,
+                ", ".join(ignored),
+            )
+    deleted_by_model = {}
+    for model in models:
+        label = f"{model._meta.app_label}.{model._meta.model_name}"
+        try:
+            deleted = purge_model(model, days=_days_for(model, label, days), now=now)
+        except Exception as e:
+            logger.exception("Ошибка очистки старых записей модели %s: %s", label, e)
+            deleted = -1
+        deleted_by_model[label] = deleted
+        if deleted > 0:
+            logger.info("Очистка %s: удалено записей %s", label, deleted)
+    return deleted_by_model
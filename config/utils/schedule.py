@@ -0,0 +1,176 @@
+"""
+Вычисление времени следующего запуска по расписаниям django-celery-beat (CrontabSchedule / IntervalSchedule).
+
+Общий модуль для всех моделей с полями interval/crontab и start_at
+(check_list.CheckListItem, lighthouse.CheckListItem, redash.RedashSQLs, redash.RedashDashboard).
+
+- Разобранные crontab-выражения кэшируются по id расписания. Запись в кэше сверяется
+  с полями расписания, поэтому изменение расписания в другом процессе (админка) не даёт
+  устаревшего результата; при сохранении/удалении расписания в текущем процессе запись сбрасывается.
+- Следующее время crontab считается по разобранным множествам минут/часов/дней
+  без повторного разбора выражения; можно получить сразу N следующих запусков.
+- Интервальные расписания, сильно отставшие от текущего времени, догоняют его за O(1).
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, time as dt_time
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django_celery_beat.models import CrontabSchedule, IntervalSchedule
+from celery.schedules import crontab as celery_crontab
+
+logger = logging.getLogger(__name__)
+
+# Сколько дней вперёд искать следующий запуск crontab. Выражения, которые не срабатывают
+# никогда (например 30 февраля), дают None вместо бесконечного цикла.
+MAX_LOOKAHEAD_DAYS = 366 * 5
+
+
+class ParsedCrontab:
+    """Разобранное crontab-выражение: отсортированные множества минут/часов/дней и таймзона."""
+
+    __slots__ = ("signature", "tz", "minutes", "hours", "days_of_week", "days_of_month", "months")
+
+    def __init__(self, schedule: CrontabSchedule):
+        self.signature = _crontab_signature(schedule)
+        self.tz = schedule.timezone
+        cron = celery_crontab(
+            minute=schedule.minute,
+            hour=schedule.hour,
+            day_of_week=schedule.day_of_week,
+            day_of_month=schedule.day_of_month,
+            month_of_year=schedule.month_of_year,
+        )
+        self.minutes = sorted(cron.minute)
+        self.hours = sorted(cron.hour)
+        self.days_of_week = frozenset(cron.day_of_week)  # 0 — воскресенье, как в celery
+        self.days_of_month = frozenset(cron.day_of_month)
+        self.months = frozenset(cron.month_of_year)
+
+    def _date_matches(self, day) -> bool:
+        # Как и celery.schedules.crontab, требуем совпадения и дня месяца, и дня недели
+        return (
+            day.month in self.months
+            and day.day in self.days_of_month
+            and day.isoweekday() % 7 in self.days_of_week
+        )
+
+    def next_after(self, after: datetime) -> datetime | None:
+        """Возвращает первый запуск строго позже after (с точностью до минуты)."""
+        local = after.astimezone(self.tz).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        day = local.date()
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if self._date_matches(day):
+                same_day = day == local.date()
+                for hour in self.hours:
+                    if same_day and hour < local.hour:
+                        continue
+                    for minute in self.minutes:
+                        if same_day and hour == local.hour and minute < local.minute:
+                            continue
+                        return datetime.combine(day, dt_time(hour, minute), tzinfo=self.tz)
+            day += timedelta(days=1)
+        return None
+
+    def next_n(self, after: datetime, n: int) -> list[datetime]:
+        """Возвращает до n следующих запусков строго позже after."""
+        result = []
+        current = after
+        for _ in range(n):
+            current = self.next_after(current)
+            if current is None:
+                break
+            result.append(current)
+        return result
+
+
+_crontab_cache: dict[int, ParsedCrontab] = {}
+_crontab_cache_lock = threading.Lock()
+
+
+def _crontab_signature(schedule: CrontabSchedule) -> tuple:
+    return (
+        schedule.minute,
+        schedule.hour,
+        schedule.day_of_week,
+        schedule.day_of_month,
+        schedule.month_of_year,
+        str(schedule.timezone),
+    )
+
+
+def get_parsed_crontab(schedule: CrontabSchedule) -> ParsedCrontab:
+    """Возвращает разобранное расписание из кэша (или разбирает и кладёт в кэш)."""
+    parsed = _crontab_cache.get(schedule.pk)
+    if parsed is None or parsed.signature != _crontab_signature(schedule):
+        parsed = ParsedCrontab(schedule)
+        with _crontab_cache_lock:
+            _crontab_cache[schedule.pk] = parsed
+    return parsed
+
+
+@receiver(post_save, sender=CrontabSchedule)
+@receiver(post_delete, sender=CrontabSchedule)
+def _invalidate_crontab_cache(sender, instance, **kwargs):
+    with _crontab_cache_lock:
+        _crontab_cache.pop(instance.pk, None)
+
+
+def interval_delta(schedule: IntervalSchedule) -> timedelta:
+    return timedelta(**{schedule.period: schedule.every})
+
+
+def next_interval_run(start_at: datetime, delta: timedelta, now: datetime) -> datetime:
+    """
+    Следующий запуск интервального расписания: start_at + k * delta для минимального k >= 1,
+    при котором время оказывается позже now. Отставшие элементы догоняют now за O(1),
+    а не по одному delta за тик.
+    """
+    if start_at + delta > now:
+        return start_at + delta
+    skipped = (now - start_at) // delta
+    return start_at + (skipped + 1) * delta
+
+
+def next_fire_times(schedule: CrontabSchedule | IntervalSchedule, after: datetime, n: int) -> list[datetime]:
+    """Возвращает n следующих запусков расписания строго позже after."""
+    if isinstance(schedule, IntervalSchedule):
+        delta = interval_delta(schedule)
+        if not delta:
+            return []
+        return [after + delta * i for i in range(1, n + 1)]
+    return get_parsed_crontab(schedule).next_n(after, n)
+
+
+def next_run_at(item, now: datetime | None = None, memo: dict | None = None) -> datetime | None:
+    """
+    Возвращает время следующего запуска для объекта с полями start_at и interval и/или crontab.
+    Если заданы оба, приоритет у interval. Если расписание не задано — возвращает None.
+
+    Args:
+        item: объект модели расписания (interval/crontab лучше подтянуть через select_related)
+        now: текущее время
+        memo: словарь для переиспользования результата crontab в рамках одного тика —
+              элементы с общим расписанием вычисляются один раз
+    """
+    now = now or timezone.now()
+    interval = getattr(item, "interval", None)
+    if interval:
+        delta = interval_delta(interval)
+        if delta:
+            return next_interval_run(item.start_at, delta, now)
+        return None
+
+    crontab = getattr(item, "crontab", None)
+    if crontab:
+        if memo is not None and crontab.pk in memo:
+            return memo[crontab.pk]
+        next_time = get_parsed_crontab(crontab).next_after(now)
+        if memo is not None:
+            memo[crontab.pk] = next_time
+        return next_time
+
+    logger.warning(f"{type(item).__name__} {item.pk} has no interval or crontab schedule set.")
+    return None
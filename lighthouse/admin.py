@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib import messages
 
-from lighthouse.models import CheckEvents, CheckListItem, Source
+from lighthouse.models import CheckEvents, CheckListItem, ElkOutbox, MetricBaseline, MetricSample, Source
 from lighthouse.tasks import run_lighthouse_for_source
 from check_list.utils.other import switch_active_status, set_start_at_now
 
@@ -42,3 +42,24 @@ class CheckEventsAdmin(admin.ModelAdmin):
     search_fields = ("source__name",)
     readonly_fields = ("event_time",)
     date_hierarchy = "event_time"
+
+
+@admin.register(ElkOutbox)
+class ElkOutboxAdmin(admin.ModelAdmin):
+    list_display = ("doc_id", "index", "created_at", "attempts", "next_attempt_at")
+    search_fields = ("index", "last_error")
+    readonly_fields = ("doc_id", "index", "document", "created_at", "attempts", "next_attempt_at", "last_error")
+
+
+@admin.register(MetricSample)
+class MetricSampleAdmin(admin.ModelAdmin):
+    list_display = ("source", "event_time", "fcp_ms", "tbt_ms", "si_ms", "lcp_ms", "cls")
+    list_filter = ("source",)
+    date_hierarchy = "event_time"
+
+
+@admin.register(MetricBaseline)
+class MetricBaselineAdmin(admin.ModelAdmin):
+    list_display = ("source", "metric", "ewma", "count", "last_alert_at")
+    list_filter = ("metric",)
+    search_fields = ("source__name",)
@@ -0,0 +1,265 @@
+"""
+Пул постоянных headless Chromium для прогонов Lighthouse.
+
+Вместо запуска нового браузера на каждый прогон процесс воркера держит
+LIGHTHOUSE_BROWSER_POOL_SIZE браузеров с открытым remote debugging port (плюс SPARE_BROWSERS
+запасных) и выдаёт их в аренду: Lighthouse подключается через --port, Playwright — через
+connect_over_cdp с новым изолированным контекстом. Один браузер одновременно арендует один прогон.
+
+- Браузер обслуживает один прогон. Lighthouse CLI открывает вкладку в контексте по умолчанию,
+  а кэш DNS и пул keep-alive соединений Chromium общие для всего процесса и через CDP не
+  сбрасываются, поэтому на переиспользованном браузере DNS/TCP того же хоста получаются около нуля.
+- После возврата в пул браузер останавливается и сразу запускается заново с новым профилем
+  (PooledBrowser.launch — только Popen, без ожидания и без потоков), а в очередь встаёт в конец.
+  Аренда берёт браузер из начала очереди, запущенный ещё во время предыдущего прогона
+  (запасной браузер), поэтому холодный старт Chromium не попадает во время прогона.
+- Перед арендой браузер перезапускается, если прогон пометил его сломанным
+  (PooledBrowser.mark_broken) или он перестал отвечать на /json/version.
+- Chromium пула запускается напрямую из процесса воркера, а не через lighthouse.supervisor:
+  на него не действуют лимиты памяти/CPU (cgroup, rlimit) и завершение дерева процессов
+  по таймауту прогона. Его ограничивают только привязка к ядрам слота (pin_process_tree)
+  и перезапуск после каждого прогона; осиротевшие процессы убирает sweep при старте воркера.
+- Пул создаётся лениво и привязан к PID: после fork дочерний процесс создаёт свой пул.
+- При недоступном пуле (размер 0, Chromium не найден или не стартовал) lease_browser отдаёт None,
+  и прогон запускает собственный браузер, как раньше.
+"""
+import os
+import queue
+import shutil
+import atexit
+import logging
+import threading
+import subprocess
+import time
+import uuid
+from contextlib import contextmanager
+
+import httpx
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать свободный браузер пула, сек
+LEASE_TIMEOUT = 600
+# Сколько ждать старта браузера (появления DevToolsActivePort), сек
+STARTUP_TIMEOUT = 20
+# Сколько браузеров сверх LIGHTHOUSE_BROWSER_POOL_SIZE держать запущенными про запас
+SPARE_BROWSERS = 1
+
+CHROME_FLAGS = [
+    "--headless",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-cache",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--remote-debugging-address=127.0.0.1",
+    "--remote-debugging-port=0",
+]
+
+_CHROME_CANDIDATES = ("chromium", "chromium-browser", "google-chrome", "google-chrome-stable")
+
+
+def find_chrome() -> str | None:
+    """Путь к Chromium: CHROME_PATH, затем бинарники из PATH."""
+    chrome_path = os.environ.get("CHROME_PATH")
+    if chrome_path:
+        return chrome_path
+    for name in _CHROME_CANDIDATES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+class PooledBrowser:
+    """Один постоянный процесс Chromium с remote debugging port."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: subprocess.Popen | None = None
+        self.port: int | None = None
+        self.user_data_dir: str | None = None
+        self.chrome_path: str | None = None
+        self.broken = False
+
+    @property
+    def cdp_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def launch(self, chrome_path: str) -> None:
+        """Запускает Chromium с новым профилем, не дожидаясь готовности (см. wait_ready)."""
+        self.chrome_path = chrome_path
+        self.user_data_dir = f"/tmp/chrome-profile-pool-{os.getpid()}-{self.index}-{uuid.uuid4().hex[:8]}"
+        self.process = subprocess.Popen(
+            [chrome_path, *CHROME_FLAGS, f"--user-data-dir={self.user_data_dir}", "about:blank"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.broken = False
+
+    def wait_ready(self) -> None:
+        """Ждёт, пока запущенный Chromium откроет remote debugging port."""
+        # Chromium с --remote-debugging-port=0 сам выбирает порт и пишет его в DevToolsActivePort
+        port_file = os.path.join(self.user_data_dir, "DevToolsActivePort")
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                with open(port_file) as f:
+                    self.port = int(f.readline().strip())
+                break
+            except (OSError, ValueError):
+                time.sleep(0.1)
+        if not self.port or not self.is_alive():
+            self.stop()
+            raise RuntimeError(f"Chromium for browser pool did not start ({self.chrome_path})")
+        logger.info("Browser pool: started Chromium #%s on port %s (pid %s)", self.index, self.port, self.process.pid)
+
+    def start(self, chrome_path: str) -> None:
+        self.launch(chrome_path)
+        self.wait_ready()
+
+    def is_alive(self) -> bool:
+        if self.process is None or self.process.poll() is not None or not self.port:
+            return False
+        try:
+            return httpx.get(f"{self.cdp_url}/json/version", timeout=2).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        self.port = None
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = None
+
+    def mark_broken(self) -> None:
+        """Браузер будет перезапущен перед следующей арендой."""
+        self.broken = True
+
+
+class BrowserPool:
+    def __init__(self, size: int, chrome_path: str):
+        self.size = size
+        self.chrome_path = chrome_path
+        self._browsers = [PooledBrowser(i) for i in range(size + SPARE_BROWSERS)]
+        self._idle: queue.Queue[PooledBrowser] = queue.Queue()
+        for browser in self._browsers:
+            self._launch(browser)
+            self._idle.put(browser)
+
+    def _launch(self, browser: PooledBrowser) -> None:
+        try:
+            browser.launch(self.chrome_path)
+        except Exception as e:
+            # Повторный запуск будет при следующей аренде (_ensure_ready)
+            logger.warning("Browser pool: failed to launch Chromium #%s: %s", browser.index, e)
+            browser.stop()
+            browser.mark_broken()
+
+    def _ensure_ready(self, browser: PooledBrowser) -> None:
+        if not browser.broken and browser.process is not None and browser.port is None:
+            # Запущен при прошлом возврате в пул: обычно уже готов
+            browser.wait_ready()
+        if browser.broken or not browser.is_alive():
+            browser.stop()
+            browser.start(self.chrome_path)
+
+    def acquire(self, timeout: float = LEASE_TIMEOUT) -> PooledBrowser:
+        """Берёт свободный браузер (ждёт до timeout) и при необходимости перезапускает его."""
+        browser = self._idle.get(timeout=timeout)
+        try:
+            self._ensure_ready(browser)
+        except Exception:
+            browser.mark_broken()
+            self._idle.put(browser)
+            raise
+        return browser
+
+    def release(self, browser: PooledBrowser) -> None:
+        """Останавливает браузер после прогона и ставит в конец очереди новый, с чистым профилем."""
+        browser.stop()
+        self._launch(browser)
+        self._idle.put(browser)
+
+    def shutdown(self) -> None:
+        for browser in self._browsers:
+            browser.stop()
+
+
+_pool: BrowserPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool | None:
+    """Пул браузеров текущего процесса или None, если пул отключён или Chromium не найден."""
+    global _pool, _pool_pid
+    size = getattr(settings, "LIGHTHOUSE_BROWSER_POOL_SIZE", 0)
+    if size <= 0:
+        return None
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            chrome_path = find_chrome()
+            if not chrome_path:
+                logger.warning("Browser pool disabled: Chromium executable not found (set CHROME_PATH)")
+                return None
+            # Браузеры родителя после fork не наследуются: создаём свой пул
+            _pool = BrowserPool(size, chrome_path)
+            _pool_pid = pid
+    return _pool
+
+
+def shutdown_browser_pool() -> None:
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown()
+        _pool = None
+
+
+atexit.register(shutdown_browser_pool)
+
+
+@worker_process_shutdown.connect
+def _shutdown_on_worker_exit(**kwargs):
+    # Дочерние процессы prefork могут завершаться без atexit
+    shutdown_browser_pool()
+
+
+@contextmanager
+def lease_browser(timeout: float = LEASE_TIMEOUT):
+    """
+    Арендует браузер пула на один прогон Lighthouse. Отдаёт PooledBrowser или None, если пул недоступен —
+    тогда прогон запускает свой браузер. Исключение внутри блока помечает браузер для перезапуска.
+    """
+    pool = get_browser_pool()
+    browser = None
+    if pool is not None:
+        try:
+            browser = pool.acquire(timeout)
+        except Exception as e:
+            logger.warning("Browser pool unavailable, launching a dedicated browser: %s", e)
+    try:
+        yield browser
+    except BaseException:
+        if browser is not None:
+            browser.mark_broken()
+        raise
+    finally:
+        if browser is not None:
+            pool.release(browser)
@@ -0,0 +1,48 @@
+"""
+Захват элементов расписания Lighthouse, готовых к проверке.
+
+Элементы выбираются одним запросом и захватываются через utils.claim, start_at сдвигается
+одним bulk_update в той же транзакции — каждый элемент запускается ровно один раз,
+даже если тики beat пересекаются или запущено несколько реплик beat/воркеров.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from lighthouse.models import CheckListItem
+from utils.claim import claim_due, release_lease, LEASE_FIELDS
+from utils.scheduler import notify_changed
+
+logger = logging.getLogger(__name__)
+
+
+def claim_due_items(now=None) -> list[int]:
+    """
+    Захватывает готовые к проверке элементы и обновляет время их следующего запуска.
+
+    Returns:
+        id захваченных элементов, по которым нужно запустить Lighthouse.
+    """
+    now = now or timezone.now()
+    item_ids = []
+    schedule_memo = {}  # следующий запуск crontab считается один раз на расписание
+    with transaction.atomic():
+        items = claim_due(
+            CheckListItem.objects.filter(
+                is_active=True,
+                source__is_active=True,
+                start_at__lte=now,
+            ).select_related("interval", "crontab"),
+            now,
+        )
+        for item in items:
+            release_lease(item)
+            next_run = item.get_next_run(now, schedule_memo)
+            if next_run:
+                item.start_at = next_run
+            item_ids.append(item.id)
+        if items:
+            CheckListItem.objects.bulk_update(items, ["start_at", *LEASE_FIELDS])
+            notify_changed("lighthouse", [item.pk for item in items])
+    return item_ids
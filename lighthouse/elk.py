@@ -0,0 +1,227 @@
+"""
+Отправка результатов Lighthouse в ELK через очередь в БД (outbox) и Bulk API.
+
+- enqueue_result кладёт результат в ElkOutbox; индекс вычисляется в момент прогона
+  (ELK_INDEX_TEMPLATE или индекс из пути ELK_URL, в том числе через плейсхолдер {index}).
+- Периодическая задача flush_elk_outbox отправляет накопленные документы пачками по ELK_BULK_SIZE
+  одним запросом POST /_bulk через общий keep-alive клиент (config.utils.http).
+- Успешно проиндексированные документы удаляются из очереди; отклонённые ELK (ошибка документа
+  в ответе _bulk) откладываются с экспоненциальной задержкой каждый отдельно, после ELK_MAX_ATTEMPTS
+  таких отказов — отбрасываются.
+- Если ELK недоступен, отвечает ошибкой на весь запрос или 429, документы откладываются на
+  OUTAGE_RETRY_SECONDS без учёта попытки, а сброс останавливается до следующего запуска задачи:
+  недоступность ELK не приводит к потере результатов (срок хранения — retention модели ElkOutbox).
+- Запрос к ELK выполняется вне транзакции: пачка захватывается в короткой транзакции (SKIP LOCKED там,
+  где поддерживается) сдвигом next_attempt_at на LEASE_SECONDS, а результат применяется во второй
+  короткой транзакции. Если воркер упал посреди отправки, документы станут доступны по истечении аренды.
+"""
+import json
+import random
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from config.utils.http import get_http_client
+from utils.claim import supports_skip_locked
+
+from lighthouse.models import ElkOutbox
+
+logger = logging.getLogger(__name__)
+
+# Задержка повтора документа: BACKOFF_BASE * 2^(попытка-1) сек, не больше BACKOFF_MAX
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+# Сколько пачек отправлять за один запуск задачи
+MAX_BATCHES = 20
+# На сколько откладываются документы, если ELK недоступен или перегружен (попытка не учитывается), сек
+OUTAGE_RETRY_SECONDS = 60
+# Аренда захваченной пачки на время запроса к ELK, сек (больше ELK_TIMEOUT)
+LEASE_SECONDS = 300
+
+
+def _get_current_index() -> str:
+    """Возвращает индекс для ELK, используя шаблон из настроек и текущую дату."""
+    elk_index_template = getattr(settings, "ELK_INDEX_TEMPLATE", "lighthouse-results-%Y-%m-%d")
+    return datetime.now(dt_timezone.utc).strftime(elk_index_template)
+
+
+def _target_index() -> str:
+    """
+    Индекс, в который пишется документ: первый сегмент пути ELK_URL после подстановки {index}
+    (как при прежней отправке через _doc), а если в пути индекса нет — по ELK_INDEX_TEMPLATE.
+    """
+    current_index = _get_current_index()
+    path = urlsplit(settings.ELK_URL.format(index=current_index)).path.strip("/")
+    index = path.split("/")[0]
+    return current_index if not index or index.startswith("_") else index
+
+
+def _bulk_url() -> str:
+    parts = urlsplit(settings.ELK_URL)
+    return f"{parts.scheme}://{parts.netloc}/_bulk"
+
+
+def get_elk_client() -> httpx.Client:
+    """Общий для процесса HTTP-клиент ELK."""
+    return get_http_client(
+        "elk",
+        verify=getattr(settings, "ELK_VERIFY_SSL", False),
+        timeout=httpx.Timeout(getattr(settings, "ELK_TIMEOUT", 30)),
+        limits=httpx.Limits(max_connections=5, max_keepalive_connections=2),
+    )
+
+
+def _auth() -> tuple[str, str]:
+    elk_user = getattr(settings, "ELK_USER", None)
+    elk_password = getattr(settings, "ELK_PASSWORD", None) or getattr(settings, "ELK_AUTH", None)
+    return (elk_user, elk_password) if (elk_user and elk_password) else ("None", "None")
+
+
+def enqueue_result(result: dict) -> ElkOutbox | None:
+    """
+    Ставит результат Lighthouse в очередь отправки в ELK, если настроен ELK_URL.
+    При DEBUG=True отправка в ELK не выполняется.
+    """
+    if getattr(settings, "DEBUG", False):
+        logger.debug("Skip posting to ELK (DEBUG=True)")
+        return None
+    if not getattr(settings, "ELK_URL", None):
+        return None
+    return ElkOutbox.objects.create(index=_target_index(), document=result)
+
+
+def _backoff(attempts: int) -> timedelta:
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay + random.uniform(0, delay / 10))
+
+
+def _bulk_body(rows: list[ElkOutbox]) -> bytes:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({"index": {"_index": row.index, "_id": row.doc_id.hex}}))
+        lines.append(json.dumps(row.document, ensure_ascii=False, default=str))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _item_error(item: dict) -> tuple[int, str | None]:
+    """Статус и ошибка одного документа из ответа _bulk."""
+    result = next(iter(item.values()), {})
+    status = result.get("status", 0)
+    if 200 <= status < 300:
+        return status, None
+    return status, json.dumps(result.get("error"), ensure_ascii=False)[:1000]
+
+
+def _defer(rows: list[ElkOutbox], errors: dict[int, str], now) -> None:
+    """Откладывает документы, не засчитывая попытку (ELK недоступен или перегружен)."""
+    for row in rows:
+        row.last_error = errors[row.pk]
+        row.next_attempt_at = now + timedelta(seconds=OUTAGE_RETRY_SECONDS)
+    ElkOutbox.objects.bulk_update(rows, ["last_error", "next_attempt_at"])
+
+
+def _postpone(rows: list[ElkOutbox], errors: dict[int, str], now) -> None:
+    """Откладывает отклонённые ELK документы; исчерпавшие попытки удаляет из очереди."""
+    max_attempts = getattr(settings, "ELK_MAX_ATTEMPTS", 10)
+    dropped = []
+    retried = []
+    for row in rows:
+        row.attempts += 1
+        row.last_error = errors[row.pk]
+        if row.attempts >= max_attempts:
+            dropped.append(row.pk)
+            logger.error("Dropping ELK document %s after %s attempts: %s", row.doc_id, row.attempts, row.last_error)
+        else:
+            row.next_attempt_at = now + _backoff(row.attempts)
+            retried.append(row)
+    if dropped:
+        ElkOutbox.objects.filter(pk__in=dropped).delete()
+    if retried:
+        ElkOutbox.objects.bulk_update(retried, ["attempts", "last_error", "next_attempt_at"])
+
+
+def _lease_batch(now, batch_size: int) -> list[ElkOutbox]:
+    """Захватывает пачку готовых к отправке документов, сдвигая их next_attempt_at на время отправки."""
+    with transaction.atomic():
+        queryset = ElkOutbox.objects.filter(next_attempt_at__lte=now).order_by("id")
+        if supports_skip_locked(queryset.db):
+            queryset = queryset.select_for_update(skip_locked=True)
+        rows = list(queryset[:batch_size])
+        if rows:
+            ElkOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+            )
+    return rows
+
+
+def flush_batch(now, batch_size: int) -> tuple[int, bool]:
+    """
+    Отправляет одну пачку готовых к отправке документов.
+    Возвращает (размер пачки, можно ли продолжать сброс).
+
+    Пачка захватывается арендой (_lease_batch), поэтому параллельные задачи не отправляют одни
+    и те же документы, а блокировки строк не удерживаются на время запроса к ELK.
+    """
+    rows = _lease_batch(now, batch_size)
+    if not rows:
+        return 0, False
+
+    try:
+        response = get_elk_client().post(
+            _bulk_url(),
+            content=_bulk_body(rows),
+            headers={"Content-Type": "application/x-ndjson"},
+            auth=_auth(),
+        )
+        response.raise_for_status()
+        items = response.json().get("items", [])
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Failed to post %s document(s) to ELK: %s", len(rows), e)
+        with transaction.atomic():
+            _defer(rows, {row.pk: str(e)[:1000] for row in rows}, now)
+        return len(rows), False
+
+    if len(items) != len(rows):
+        logger.warning("ELK _bulk returned %s item(s) for %s document(s)", len(items), len(rows))
+    errors = {}
+    throttled = set()
+    for row, item in zip(rows, items):
+        status, error = _item_error(item)
+        if error is not None:
+            errors[row.pk] = error
+            if status == 429:
+                throttled.add(row.pk)
+    # Документы без ответа считаем неотправленными (не по вине документа — попытку не засчитываем)
+    for row in rows[len(items):]:
+        errors[row.pk] = "No item in _bulk response"
+        throttled.add(row.pk)
+
+    rejected = [row for row in rows if row.pk in errors and row.pk not in throttled]
+    with transaction.atomic():
+        ElkOutbox.objects.filter(pk__in=[row.pk for row in rows if row.pk not in errors]).delete()
+        if rejected:
+            logger.warning("ELK rejected %s of %s document(s)", len(rejected), len(rows))
+            _postpone(rejected, errors, now)
+        if throttled:
+            _defer([row for row in rows if row.pk in throttled], errors, now)
+    return len(rows), not throttled
+
+
+def flush_outbox(now=None, max_batches: int = MAX_BATCHES) -> int:
+    """Отправляет очередь в ELK пачками по ELK_BULK_SIZE. Возвращает количество обработанных документов."""
+    if not getattr(settings, "ELK_URL", None):
+        return 0
+    now = now or timezone.now()
+    batch_size = getattr(settings, "ELK_BULK_SIZE", 500)
+    total = 0
+    for _ in range(max_batches):
+        sent, proceed = flush_batch(now, batch_size)
+        total += sent
+        if not proceed or sent < batch_size:
+            break
+    return total
@@ -0,0 +1,147 @@
+"""
+Временные ряды метрик Lighthouse.
+
+- record_result сохраняет метрики успешного прогона в MetricSample (колонка на метрику,
+  индекс (source, event_time)) и пересчитывает агрегаты часа и дня, в которые попал прогон.
+- Агрегаты (MetricHourly, MetricDaily) — min, медиана, p95 и число прогонов на метрику за интервал.
+  Медиану и p95 нельзя обновить по одному значению, поэтому интервал пересчитывается целиком
+  по MetricSample: в часе и дне единицы–сотни прогонов, выборка идёт по индексу.
+- get_series отдаёт ряд за период не длиннее max_points точек: сырые прогоны, часовые или дневные
+  агрегаты — в зависимости от длины периода; при необходимости соседние точки объединяются.
+Границы часов и дней — в TIME_ZONE проекта.
+"""
+import math
+import statistics
+from datetime import timedelta
+
+from django.utils import timezone
+
+from lighthouse.models import CheckEvents, MetricDaily, MetricHourly, MetricSample
+
+METRIC_FIELDS = ("fcp_ms", "tbt_ms", "si_ms", "lcp_ms", "cls", "dns_ms", "tcp_ms")
+
+RESOLUTION_RAW = "raw"
+RESOLUTION_HOUR = "hour"
+RESOLUTION_DAY = "day"
+
+_ROLLUPS = (
+    (MetricHourly, RESOLUTION_HOUR),
+    (MetricDaily, RESOLUTION_DAY),
+)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией (values отсортированы)."""
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def bucket_bounds(moment, resolution: str):
+    """Начало и конец часа/дня (в TIME_ZONE проекта), в который попадает moment."""
+    local = timezone.localtime(moment)
+    if resolution == RESOLUTION_HOUR:
+        start = local.replace(minute=0, second=0, microsecond=0)
+        return start, start + timedelta(hours=1)
+    start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=1)
+
+
+def refresh_rollups(source_id: int, moment) -> None:
+    """Пересчитывает часовой и дневной агрегаты источника, в которые попадает moment."""
+    for model, resolution in _ROLLUPS:
+        start, end = bucket_bounds(moment, resolution)
+        rows = MetricSample.objects.filter(
+            source_id=source_id, event_time__gte=start, event_time__lt=end
+        ).values_list(*METRIC_FIELDS)
+        rollups = []
+        for metric, values in zip(METRIC_FIELDS, zip(*rows)):
+            values = sorted(value for value in values if value is not None)
+            if not values:
+                continue
+            rollups.append(model(
+                source_id=source_id,
+                metric=metric,
+                bucket_start=start,
+                count=len(values),
+                min=values[0],
+                median=statistics.median(values),
+                p95=percentile(values, 0.95),
+            ))
+        model.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=["source", "metric", "bucket_start"],
+            update_fields=["count", "min", "median", "p95"],
+        )
+
+
+def record_result(event: CheckEvents, result: dict) -> MetricSample | None:
+    """Сохраняет метрики успешного прогона и обновляет агрегаты. Для неуспешных прогонов ничего не делает."""
+    metrics = result.get("metrics")
+    if result.get("status") != "success" or not metrics:
+        return None
+    sample = MetricSample.objects.create(
+        source_id=event.source_id,
+        event_time=event.event_time,
+        **{field: metrics.get(field) for field in METRIC_FIELDS},
+    )
+    refresh_rollups(event.source_id, sample.event_time)
+    return sample
+
+
+def _choose_resolution(start, end, max_points: int) -> str:
+    step = (end - start) / max(max_points, 1)
+    if step >= timedelta(days=1):
+        return RESOLUTION_DAY
+    if step >= timedelta(hours=1):
+        return RESOLUTION_HOUR
+    return RESOLUTION_RAW
+
+
+def _load_points(source_id: int, metric: str, start, end, resolution: str) -> list[dict]:
+    if resolution == RESOLUTION_RAW:
+        rows = (
+            MetricSample.objects.filter(source_id=source_id, event_time__gte=start, event_time__lt=end)
+            .exclude(**{f"{metric}__isnull": True})
+            .order_by("event_time")
+            .values_list("event_time", metric)
+        )
+        return [{"t": t, "count": 1, "min": value, "median": value, "p95": value} for t, value in rows]
+    model = MetricHourly if resolution == RESOLUTION_HOUR else MetricDaily
+    rows = (
+        model.objects.filter(source_id=source_id, metric=metric, bucket_start__gte=start, bucket_start__lt=end)
+        .order_by("bucket_start")
+        .values_list("bucket_start", "count", "min", "median", "p95")
+    )
+    return [
+        {"t": t, "count": count, "min": min_value, "median": median, "p95": p95}
+        for t, count, min_value, median, p95 in rows
+    ]
+
+
+def _merge(points: list[dict]) -> dict:
+    """Объединяет соседние точки: min — минимум, p95 — максимум, медиана — медиана медиан (оценка)."""
+    return {
+        "t": points[0]["t"],
+        "count": sum(point["count"] for point in points),
+        "min": min(point["min"] for point in points),
+        "median": statistics.median(point["median"] for point in points),
+        "p95": max(point["p95"] for point in points),
+    }
+
+
+def get_series(source_id: int, metric: str, start, end, max_points: int) -> tuple[str, list[dict]]:
+    """
+    Ряд метрики источника за [start, end) не длиннее max_points точек.
+    Возвращает (разрешение: raw/hour/day, точки {t, count, min, median, p95}).
+    """
+    if metric not in METRIC_FIELDS:
+        raise ValueError(f"Unknown metric {metric!r}")
+    resolution = _choose_resolution(start, end, max_points)
+    points = _load_points(source_id, metric, start, end, resolution)
+    if len(points) > max_points > 0:
+        size = math.ceil(len(points) / max_points)
+        points = [_merge(points[i:i + size]) for i in range(0, len(points), size)]
+    return resolution, points
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lighthouse', '0039_alter_checklistitem_start_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checklistitem',
+            name='lease_token',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='checklistitem',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lighthouse', '0041_alter_checkevents_event_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElkOutbox',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('doc_id', models.UUIDField(default=uuid.uuid4, editable=False, help_text='_id документа в ELK: повторная отправка не создаёт дубль.')),
+                ('index', models.CharField(max_length=255)),
+                ('document', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Очередь отправки в ELK',
+                'verbose_name_plural': 'Очередь отправки в ELK',
+            },
+        ),
+    ]
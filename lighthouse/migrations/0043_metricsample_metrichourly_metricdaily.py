@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lighthouse', '0042_elkoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSample',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_time', models.DateTimeField()),
+                ('fcp_ms', models.FloatField(blank=True, null=True)),
+                ('tbt_ms', models.FloatField(blank=True, null=True)),
+                ('si_ms', models.FloatField(blank=True, null=True)),
+                ('lcp_ms', models.FloatField(blank=True, null=True)),
+                ('cls', models.FloatField(blank=True, null=True)),
+                ('dns_ms', models.FloatField(blank=True, null=True)),
+                ('tcp_ms', models.FloatField(blank=True, null=True)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_samples', to='lighthouse.source')),
+            ],
+            options={
+                'verbose_name': 'Метрики Lighthouse',
+                'verbose_name_plural': 'Метрики Lighthouse',
+                'indexes': [
+                    models.Index(fields=['source', 'event_time'], name='metricsample_source_time_idx'),
+                    models.Index(fields=['event_time'], name='metricsample_time_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='MetricHourly',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('metric', models.CharField(max_length=16)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('min', models.FloatField()),
+                ('median', models.FloatField()),
+                ('p95', models.FloatField()),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='lighthouse.source')),
+            ],
+            options={
+                'verbose_name': 'Метрики Lighthouse по часам',
+                'verbose_name_plural': 'Метрики Lighthouse по часам',
+                'indexes': [models.Index(fields=['bucket_start'], name='metrichourly_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'metric', 'bucket_start'), name='metrichourly_bucket_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MetricDaily',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('metric', models.CharField(max_length=16)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('min', models.FloatField()),
+                ('median', models.FloatField()),
+                ('p95', models.FloatField()),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='lighthouse.source')),
+            ],
+            options={
+                'verbose_name': 'Метрики Lighthouse по дням',
+                'verbose_name_plural': 'Метрики Lighthouse по дням',
+                'constraints': [models.UniqueConstraint(fields=('source', 'metric', 'bucket_start'), name='metricdaily_bucket_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lighthouse', '0043_metricsample_metrichourly_metricdaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricBaseline',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('metric', models.CharField(max_length=16)),
+                ('recent', models.JSONField(default=list, help_text='Последние значения метрики (окно).')),
+                ('ewma', models.FloatField(default=0.0)),
+                ('ewm_var', models.FloatField(default=0.0)),
+                ('count', models.PositiveIntegerField(default=0, help_text='Сколько значений учтено в EWMA.')),
+                ('last_alert_at', models.DateTimeField(blank=True, help_text='Когда отправлено уведомление о текущей регрессии.', null=True)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_baselines', to='lighthouse.source')),
+            ],
+            options={
+                'verbose_name': 'Базовая линия метрики Lighthouse',
+                'verbose_name_plural': 'Базовые линии метрик Lighthouse',
+                'constraints': [models.UniqueConstraint(fields=('source', 'metric'), name='metricbaseline_source_metric_uniq')],
+            },
+        ),
+    ]
@@ -1,13 +1,15 @@
+import uuid
 import logging
 
-from datetime import timedelta
-from django.utils import timezone
 from django.db import models
+from django.utils import timezone
 
 from django_celery_beat.models import IntervalSchedule, CrontabSchedule
 from celery.schedules import crontab as celery_crontab
 
 from config.utils.time import default_start_at
+from config.utils.schedule import next_run_at
+from config.utils.retention import RetentionPolicy
 
 logger = logging.getLogger(__name__)
 
@@ -95,32 +97,29 @@ class CheckListItem(models.Model):
     is_active = models.BooleanField(default=True)
     start_at = models.DateTimeField(default=default_start_at,
                                     help_text="Время запуска задачи. (по стандарту через 5 минут от текущего времени)")
+    # Аренда строки воркером при захвате (используется на БД без SELECT ... FOR UPDATE SKIP LOCKED, см. utils.claim)
+    lease_token = models.UUIDField(null=True, blank=True, editable=False)
+    lease_until = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Элемент расписания Lighthouse"
         verbose_name_plural = "Элементы расписания Lighthouse"
 
+    def get_next_run(self, now=None, memo: dict | None = None):
+        """
+        Возвращает время следующего запуска задачи, не сохраняя его.
+        Если расписание не задано — возвращает None.
+        """
+        return next_run_at(self, now, memo)
+
     def set_next_run(self):
         """
         Задает следующий интервал запуска задачи.
         """
-        if self.interval:
-            schedule = self.interval
-            delta = timedelta(**{schedule.period: schedule.every})
-            if delta:
-                self.start_at += delta
-                self.save(update_fields=["start_at"])
-        
-        elif self.crontab:
-            schedule = self.crontab
-            celery_cron = schedule.schedule
-            now_in_cron_tz = timezone.now().astimezone(schedule.timezone)
-            next_time = celery_cron.remaining_estimate(now_in_cron_tz)
-            if next_time:
-                self.start_at = timezone.now() + next_time
-                self.save(update_fields=["start_at"])
-        else:
-            logger.warning(f"CheckListItem {self.id} has no interval or crontab schedule set.")
+        next_run = self.get_next_run()
+        if next_run:
+            self.start_at = next_run
+            self.save(update_fields=["start_at"])
 
     def __str__(self):
         return self.description
@@ -132,7 +131,7 @@ class CheckEvents(models.Model):
         on_delete=models.CASCADE,
         related_name='check_events',
     )
-    event_time = models.DateTimeField(auto_now_add=True)
+    event_time = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(max_length=32, blank=True, null=True)
     metrics = models.JSONField(
         blank=True,
@@ -141,6 +140,9 @@ class CheckEvents(models.Model):
     )
     error_message = models.TextField(blank=True, null=True)
 
+    # Хранение истории (см. utils.clean)
+    retention = RetentionPolicy("event_time", days=2, overridable=True)
+
     class Meta:
         verbose_name = "История Lighthouse"
         verbose_name_plural = "Истории Lighthouse"
@@ -148,9 +150,130 @@ class CheckEvents(models.Model):
     def __str__(self):
         return f"History for {self.source.name} at {self.event_time}"
 
-    def clear_old(self, days: int = 2):
-        """
-        Очищает старые запросы, которые были созданы более days (по дефолту 2) дней назад.
-        """
-        if self.event_time < (timezone.now() - timezone.timedelta(days=days)):
-            self.delete()
+
+class ElkOutbox(models.Model):
+    """
+    Очередь результатов Lighthouse на отправку в ELK (см. lighthouse.elk).
+    Строка удаляется после успешной индексации документа; при ошибке откладывается до next_attempt_at.
+    """
+    id = models.BigAutoField(primary_key=True)
+    doc_id = models.UUIDField(default=uuid.uuid4, editable=False, help_text="_id документа в ELK: повторная отправка не создаёт дубль.")
+    index = models.CharField(max_length=255)
+    document = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True, null=True)
+
+    # Во время долгой недоступности ELK очередь не растёт бесконечно (см. utils.clean)
+    retention = RetentionPolicy("created_at", days=7)
+
+    class Meta:
+        verbose_name = "Очередь отправки в ELK"
+        verbose_name_plural = "Очередь отправки в ELK"
+
+    def __str__(self):
+        return f"ELK document {self.doc_id} -> {self.index}"
+
+
+class MetricSample(models.Model):
+    """
+    Метрики одного успешного прогона Lighthouse в отдельных колонках (см. lighthouse.metrics).
+    Хранится дольше CheckEvents: по этой таблице и агрегатам строятся ряды за месяцы.
+    """
+    id = models.BigAutoField(primary_key=True)
+    source = models.ForeignKey(
+        Source,
+        on_delete=models.CASCADE,
+        related_name='metric_samples',
+    )
+    event_time = models.DateTimeField()
+    fcp_ms = models.FloatField(blank=True, null=True)
+    tbt_ms = models.FloatField(blank=True, null=True)
+    si_ms = models.FloatField(blank=True, null=True)
+    lcp_ms = models.FloatField(blank=True, null=True)
+    cls = models.FloatField(blank=True, null=True)
+    dns_ms = models.FloatField(blank=True, null=True)
+    tcp_ms = models.FloatField(blank=True, null=True)
+
+    # Хранение истории (см. utils.clean)
+    retention = RetentionPolicy("event_time", days=90)
+
+    class Meta:
+        verbose_name = "Метрики Lighthouse"
+        verbose_name_plural = "Метрики Lighthouse"
+        indexes = [
+            models.Index(fields=["source", "event_time"], name="metricsample_source_time_idx"),
+            # Для очистки по сроку хранения
+            models.Index(fields=["event_time"], name="metricsample_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"Metrics for source {self.source_id} at {self.event_time}"
+
+
+class MetricRollup(models.Model):
+    """Агрегат метрики источника за интервал bucket_start: min, медиана, p95 и число прогонов."""
+    id = models.BigAutoField(primary_key=True)
+    source = models.ForeignKey(Source, on_delete=models.CASCADE, related_name='+')
+    metric = models.CharField(max_length=16)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    min = models.FloatField()
+    median = models.FloatField()
+    p95 = models.FloatField()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.metric} for source {self.source_id} at {self.bucket_start}"
+
+
+class MetricHourly(MetricRollup):
+    # Хранение истории (см. utils.clean)
+    retention = RetentionPolicy("bucket_start", days=365)
+
+    class Meta:
+        verbose_name = "Метрики Lighthouse по часам"
+        verbose_name_plural = "Метрики Lighthouse по часам"
+        constraints = [
+            models.UniqueConstraint(fields=["source", "metric", "bucket_start"], name="metrichourly_bucket_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["bucket_start"], name="metrichourly_bucket_idx"),
+        ]
+
+
+class MetricDaily(MetricRollup):
+    class Meta:
+        verbose_name = "Метрики Lighthouse по дням"
+        verbose_name_plural = "Метрики Lighthouse по дням"
+        constraints = [
+            models.UniqueConstraint(fields=["source", "metric", "bucket_start"], name="metricdaily_bucket_uniq"),
+        ]
+
+
+class MetricBaseline(models.Model):
+    """
+    Скользящая статистика метрики источника для детектора регрессий (см. lighthouse.regressions):
+    окно последних значений и EWMA/дисперсия значений, вышедших из окна.
+    """
+    id = models.BigAutoField(primary_key=True)
+    source = models.ForeignKey(Source, on_delete=models.CASCADE, related_name='metric_baselines')
+    metric = models.CharField(max_length=16)
+    recent = models.JSONField(default=list, help_text="Последние значения метрики (окно).")
+    ewma = models.FloatField(default=0.0)
+    ewm_var = models.FloatField(default=0.0)
+    count = models.PositiveIntegerField(default=0, help_text="Сколько значений учтено в EWMA.")
+    last_alert_at = models.DateTimeField(blank=True, null=True, help_text="Когда отправлено уведомление о текущей регрессии.")
+
+    class Meta:
+        verbose_name = "Базовая линия метрики Lighthouse"
+        verbose_name_plural = "Базовые линии метрик Lighthouse"
+        constraints = [
+            models.UniqueConstraint(fields=["source", "metric"], name="metricbaseline_source_metric_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} baseline for source {self.source_id}"
@@ -0,0 +1,217 @@
+"""
+Детектор регрессий метрик Lighthouse.
+
+На каждую пару (источник, метрика) хранится одна строка MetricBaseline постоянного размера:
+- recent — последние LIGHTHOUSE_REGRESSION_WINDOW значений; по ним считается текущий p75;
+- ewma / ewm_var — экспоненциально взвешенные среднее и дисперсия значений, вышедших из окна
+  (базовая линия не «впитывает» свежую регрессию, пока та в окне).
+
+observe_result обновляет строки по результату одного прогона (без чтения истории) и, если p75 окна
+превышает базовую линию больше чем на LIGHTHOUSE_REGRESSION_THRESHOLD (и на 3σ, и на абсолютный минимум
+метрики), отправляет в бот уведомление. Повтор уведомления по той же метрике — не раньше
+LIGHTHOUSE_REGRESSION_COOLDOWN_HOURS; после возврата метрики к норме состояние сбрасывается.
+
+Уведомление уходит через эндпоинт рассылки дашбордов бота (SEND_MESSAGE_ENDPOINT, формат DashboardModel):
+одно сообщение на прогон со всеми выросшими метриками источника. Бот показывает у сообщения кнопки проверки,
+поэтому за уведомлением стоит настоящее событие чек-листа (check_list.CheckEvents) служебного дашборда
+источника lighthouse-{source_id}: ссылка-счётчик и колбэк кнопок работают как для обычного дашборда.
+Запрос к боту выполняется после коммита
+транзакции со строками MetricBaseline; если бот его не принял, отметка last_alert_at снимается
+и уведомление повторится на следующем прогоне.
+"""
+import html
+import math
+import uuid
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from check_list.delivery import post_dashboards, mark_delivered
+from check_list.models import CheckEvents as CheckListEvent, Dashboard
+from config.settings import DJANGO_EXTERNAL_URL
+from check_list.pydantic_models import DashboardModel
+from lighthouse.metrics import percentile
+from lighthouse.models import CheckEvents, MetricBaseline
+
+logger = logging.getLogger(__name__)
+
+# Метрики под наблюдением и минимальный абсолютный рост, который считается регрессией
+WATCHED_METRICS = {
+    "fcp_ms": 100.0,
+    "lcp_ms": 200.0,
+    "si_ms": 200.0,
+    "tbt_ms": 50.0,
+    "cls": 0.05,
+}
+# Во сколько стандартных отклонений базовой линии должен вырасти p75 окна
+SIGMA_THRESHOLD = 3.0
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def _update_baseline(baseline: MetricBaseline, value: float) -> None:
+    """Добавляет значение в окно; вытесненное из окна значение обновляет EWMA и дисперсию."""
+    window = max(_setting("LIGHTHOUSE_REGRESSION_WINDOW", 5), 1)
+    alpha = _setting("LIGHTHOUSE_REGRESSION_ALPHA", 0.1)
+    baseline.recent = (baseline.recent or []) + [value]
+    while len(baseline.recent) > window:
+        old = baseline.recent.pop(0)
+        if baseline.count == 0:
+            baseline.ewma, baseline.ewm_var = old, 0.0
+        else:
+            diff = old - baseline.ewma
+            baseline.ewma += alpha * diff
+            baseline.ewm_var = (1 - alpha) * (baseline.ewm_var + alpha * diff * diff)
+        baseline.count += 1
+
+
+def _current(baseline: MetricBaseline) -> float | None:
+    """p75 окна, если окно заполнено."""
+    window = max(_setting("LIGHTHOUSE_REGRESSION_WINDOW", 5), 1)
+    if len(baseline.recent) < window:
+        return None
+    return percentile(sorted(baseline.recent), 0.75)
+
+
+def is_regressed(baseline: MetricBaseline, current: float | None) -> bool:
+    if current is None or baseline.count < _setting("LIGHTHOUSE_REGRESSION_MIN_BASELINE", 10):
+        return False
+    delta = current - baseline.ewma
+    return (
+        delta > baseline.ewma * _setting("LIGHTHOUSE_REGRESSION_THRESHOLD", 0.2)
+        and delta > SIGMA_THRESHOLD * math.sqrt(baseline.ewm_var)
+        and delta >= WATCHED_METRICS[baseline.metric]
+    )
+
+
+def build_alert(event: CheckEvents, baseline: MetricBaseline, current: float) -> dict:
+    source = event.source
+    return {
+        "source_id": source.pk,
+        "name": source.name,
+        "url": source.url,
+        "metric": baseline.metric,
+        "current_p75": round(current, 3),
+        "baseline": round(baseline.ewma, 3),
+        "baseline_std": round(math.sqrt(baseline.ewm_var), 3),
+        "change_pct": round((current / baseline.ewma - 1) * 100, 1) if baseline.ewma else None,
+        "window": list(baseline.recent),
+        "event_time": event.event_time.isoformat() if event.event_time else None,
+    }
+
+
+def _format_value(metric: str, value: float) -> str:
+    return f"{value:.3f}" if metric == "cls" else f"{value:.0f} мс"
+
+
+def create_alert_event(alerts: list[dict]) -> CheckListEvent:
+    """Событие чек-листа для уведомления: служебный дашборд источника и событие без срока проверки."""
+    first = alerts[0]
+    dashboard, _ = Dashboard.objects.update_or_create(
+        uid=f"lighthouse-{first['source_id']}",
+        defaults={"name": f"Lighthouse: {first['name']}"[:255], "url": first["url"], "time_for_check": 0},
+    )
+    return CheckListEvent.objects.create(uuid=uuid.uuid4(), dashboard=dashboard)
+
+
+def build_message(alerts: list[dict], event: CheckListEvent) -> dict:
+    """Сообщение о регрессиях одного источника в формате рассылки дашбордов (DashboardModel)."""
+    first = alerts[0]
+    lines = []
+    for alert in alerts:
+        change = f", {alert['change_pct']:+.1f}%" if alert["change_pct"] is not None else ""
+        lines.append(
+            f"{html.escape(alert['metric'])}: p75 {_format_value(alert['metric'], alert['current_p75'])} "
+            f"(база {_format_value(alert['metric'], alert['baseline'])}{change})"
+        )
+    return DashboardModel(
+        event_uuid=event.uuid.hex,
+        dashboard_uid=event.dashboard.uid,
+        name=f"Регрессия Lighthouse: {html.escape(first['name'])}",
+        description="\n".join(lines),
+        real_url=first["url"],
+        fake_url=f"http://{DJANGO_EXTERNAL_URL}/acl_api/to_dashboard/{event.uuid.hex}/",
+        time_for_check=0,
+    ).model_dump(mode="json")
+
+
+def post_regressions(alerts: list[dict]) -> None:
+    """
+    Создаёт событие чек-листа и отправляет уведомление о регрессиях источника в бот.
+    Если бот не принял уведомление, событие удаляется, а ошибка HTTP пробрасывается.
+    """
+    event = create_alert_event(alerts)
+    message = build_message(alerts, event)
+    try:
+        post_dashboards([message])
+    except Exception:
+        event.delete()
+        raise
+    mark_delivered([message])
+
+
+def observe_result(event: CheckEvents, result: dict, now=None) -> list[dict]:
+    """
+    Учитывает метрики успешного прогона в базовых линиях источника и уведомляет бот о регрессиях.
+    Возвращает отправленные уведомления.
+    """
+    metrics = result.get("metrics")
+    if result.get("status") != "success" or not metrics:
+        return []
+    values = {metric: metrics.get(metric) for metric in WATCHED_METRICS if metrics.get(metric) is not None}
+    if not values:
+        return []
+    now = now or timezone.now()
+    cooldown = timedelta(hours=_setting("LIGHTHOUSE_REGRESSION_COOLDOWN_HOURS", 6))
+
+    with transaction.atomic():
+        existing = {
+            baseline.metric: baseline
+            for baseline in MetricBaseline.objects.select_for_update().filter(
+                source_id=event.source_id, metric__in=list(values)
+            )
+        }
+        baselines = []
+        alerts = []
+        alerted = []
+        for metric, value in values.items():
+            baseline = existing.get(metric) or MetricBaseline(source_id=event.source_id, metric=metric)
+            _update_baseline(baseline, float(value))
+            current = _current(baseline)
+            if is_regressed(baseline, current):
+                if baseline.last_alert_at is None or now - baseline.last_alert_at >= cooldown:
+                    alerts.append(build_alert(event, baseline, current))
+                    alerted.append(baseline)
+            else:
+                baseline.last_alert_at = None
+            baselines.append(baseline)
+
+        previous_alert_at = {baseline.pk: baseline.last_alert_at for baseline in alerted}
+        for baseline in alerted:
+            baseline.last_alert_at = now
+
+        MetricBaseline.objects.bulk_update(
+            [baseline for baseline in baselines if baseline.pk is not None],
+            ["recent", "ewma", "ewm_var", "count", "last_alert_at"],
+        )
+        # Строку новой метрики мог одновременно создать параллельный прогон: его строка остаётся
+        MetricBaseline.objects.bulk_create(
+            [baseline for baseline in baselines if baseline.pk is None], ignore_conflicts=True
+        )
+    if not alerts:
+        return []
+    try:
+        post_regressions(alerts)
+    except Exception as e:
+        # Статистика сохраняется; снимаем отметку, чтобы уведомление повторилось при следующем прогоне
+        logger.warning("Failed to post Lighthouse regressions for source %s: %s", event.source_id, e)
+        for pk, last_alert_at in previous_alert_at.items():
+            MetricBaseline.objects.filter(pk=pk, last_alert_at=now).update(last_alert_at=last_alert_at)
+        return []
+    logger.info("Lighthouse regressions for source %s: %s", event.source_id, [a["metric"] for a in alerts])
+    return alerts
@@ -0,0 +1,131 @@
+"""
+Кэш результатов Lighthouse по конфигурации прогона.
+
+Несколько Source и ручной запуск из админки часто проверяют один и тот же URL с теми же параметрами
+эмуляции с разницей в минуты. Результат успешного прогона кладётся в кэш Django (Redis) по ключу
+sha256(url, хэш заголовков, playwright_mode, lighthouse_mode, параметры сэмплирования)
+на LIGHTHOUSE_RESULT_CACHE_SECONDS; повторные задачи в этом окне прогон не запускают.
+
+Одновременные одинаковые задачи объединяются: прогон выполняет только задача, взявшая блокировку
+(cache.add, в значении — время взятия). Остальные не ждут в воркере, а откладываются (defer —
+task.retry с countdown RETRY_INTERVAL) и при повторе снова проверяют кэш. Если владелец блокировки
+завершился без успешного результата, блокировку берёт следующая задача; если прогон держит её дольше
+LIGHTHOUSE_RESULT_WAIT_SECONDS, блокировка считается брошенной и перехватывается.
+Каждая задача сохраняет свой CheckEvents; metadata результата подменяется на metadata вызывающего.
+В кэше хранится id источника, выполнившего прогон (source_id): результат из кэша получает его
+в cache_source_id, чтобы метрики не записывались дважды только для того же источника.
+Ошибки кэша не пробрасываются: при недоступном Redis прогон выполняется как обычно.
+"""
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from lighthouse.runner import _get_modes_from_metadata, _get_samples_from_metadata
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд отложенная задача снова проверяет кэш
+RETRY_INTERVAL = 10
+# Время жизни блокировки прогона, сек (страховка, если владелец упал, не сняв её)
+LOCK_TIMEOUT = 900
+
+
+def result_key(url: str, metadata: dict[str, Any] | None, headers: dict | None) -> str:
+    """Ключ конфигурации прогона: всё, от чего зависят метрики, без полей metadata для ELK."""
+    metadata = metadata or {}
+    playwright_mode, lighthouse_mode = _get_modes_from_metadata(metadata)
+    samples, max_cv = _get_samples_from_metadata(metadata)
+    headers_hash = hashlib.sha256(json.dumps(headers or {}, sort_keys=True).encode()).hexdigest()
+    config = {
+        "url": url,
+        "headers": headers_hash,
+        "playwright_mode": playwright_mode,
+        "lighthouse_mode": lighthouse_mode,
+        "samples": [samples, max_cv],
+        "playwright_timings": metadata.get("lighthouse_playwright_timings") is True,
+    }
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+    return f"lighthouse:result:{digest}"
+
+
+def _lock_key(key: str) -> str:
+    return f"{key}:lock"
+
+
+def _for_caller(result: dict, metadata: dict[str, Any] | None) -> dict:
+    shared = dict(result)
+    shared["cache_source_id"] = shared.pop("source_id", None)
+    shared["metadata"] = metadata
+    shared["cache_hit"] = True
+    return shared
+
+
+def _result_or_lock(key: str, wait_seconds: float) -> dict | bool:
+    """
+    Результат той же конфигурации из кэша, True — блокировка прогона взята вызывающим,
+    False — идёт одновременный прогон, результата пока нет.
+    """
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    now = time.time()
+    if cache.add(_lock_key(key), now, timeout=LOCK_TIMEOUT):
+        return True
+    locked_at = cache.get(_lock_key(key))
+    if not isinstance(locked_at, (int, float)) or now - locked_at >= wait_seconds:
+        # Владелец прогона завис или упал, не сняв блокировку: перехватываем её
+        cache.set(_lock_key(key), now, timeout=LOCK_TIMEOUT)
+        return True
+    return False
+
+
+def get_or_run(
+    url: str,
+    metadata: dict[str, Any] | None,
+    headers: dict | None,
+    run: Callable[[], dict | None],
+    defer: Callable[[], None],
+    source_id: int | None = None,
+) -> dict | None:
+    """
+    Возвращает свежий результат из кэша или результат run() (успешный результат кладётся в кэш
+    вместе с source_id источника, выполнившего прогон).
+    Если одновременно идёт прогон той же конфигурации, вызывается defer(): он откладывает задачу
+    (бросает Retry), не занимая воркер ожиданием. Если defer вернул управление (повторы исчерпаны),
+    прогон выполняется сразу.
+    """
+    ttl = getattr(settings, "LIGHTHOUSE_RESULT_CACHE_SECONDS", 0)
+    if ttl <= 0:
+        return run()
+    key = result_key(url, metadata, headers)
+    try:
+        state = _result_or_lock(key, getattr(settings, "LIGHTHOUSE_RESULT_WAIT_SECONDS", 300))
+    except Exception as e:
+        logger.warning("Lighthouse result cache unavailable, running %s: %s", url, e)
+        return run()
+    if isinstance(state, dict):
+        logger.info("Lighthouse result for %s taken from cache", url)
+        return _for_caller(state, metadata)
+    if state is False:
+        defer()
+        logger.warning("Gave up waiting for a concurrent Lighthouse run of %s, running it", url)
+        return run()
+
+    try:
+        result = run()
+        if result and result.get("status") == "success":
+            try:
+                cache.set(key, {**result, "source_id": source_id}, timeout=ttl)
+            except Exception as e:
+                logger.warning("Failed to cache Lighthouse result for %s: %s", url, e)
+        return result
+    finally:
+        try:
+            cache.delete(_lock_key(key))
+        except Exception as e:
+            logger.warning("Failed to release Lighthouse run lock for %s: %s", url, e)
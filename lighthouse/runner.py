@@ -1,6 +1,8 @@
 """
-Запуск Lighthouse CLI и извлечение метрик (FCP, TBT, SI, LCP, CLS).
+Запуск Lighthouse CLI и извлечение метрик (FCP, TBT, SI, LCP, CLS; DNS/TCP — из devtools-лога того же прогона).
 Логика перенесена из autoLighthouse; использует стандартный logging.
+Отчёт и devtools-лог разбираются потоково (ijson): в память попадают только нужные
+значения, из вывода процесса держится лишь хвост stderr.
 """
 import shutil
 import uuid
@@ -9,9 +11,11 @@ import logging
 import os
 import subprocess
 import tempfile
+import statistics
 from datetime import datetime, timezone
 from typing import Any
 
+import ijson
 from tenacity import (
     retry,
     retry_if_exception_type,
@@ -20,18 +24,30 @@ from tenacity import (
 )
 from playwright.sync_api import sync_playwright
 
+from lighthouse.browser_pool import PooledBrowser, lease_browser
+from lighthouse.metrics import percentile
+from lighthouse.slots import pin_process_tree
+from lighthouse.supervisor import run_supervised
+
 logger = logging.getLogger(__name__)
 
+# Метрики, по которым агрегируются несколько прогонов (медиана, p75, разброс)
+SAMPLE_METRICS = ("fcp_ms", "tbt_ms", "si_ms", "lcp_ms", "cls", "dns_ms", "tcp_ms")
+# Метрики, по которым оценивается стабильность для досрочной остановки
+STABILITY_METRICS = ("fcp_ms", "si_ms", "lcp_ms", "tbt_ms")
+MAX_SAMPLES = 10
+MIN_SAMPLES_FOR_EARLY_STOP = 3
+DEFAULT_SAMPLES_CV = 0.05
+# Сколько последних строк stderr lighthouse хранить для сообщения об ошибке
+STDERR_TAIL_LINES = 50
+
 
-def _safe_metric(audits: dict, key: str) -> float | None:
+def _safe_metric(values: dict, key: str) -> float | None:
     """
-    Безопасно достаёт numericValue из аудита Lighthouse.
+    Безопасно достаёт numericValue аудита Lighthouse из словаря {аудит: numericValue}.
     Возвращает float или None, если метрика отсутствует/битая.
     """
-    metric = audits.get(key)
-    if not metric:
-        return None
-    value = metric.get("numericValue")
+    value = values.get(key)
     try:
         return float(value)
     except (TypeError, ValueError):
@@ -43,10 +59,13 @@ def _get_navigation_timings_playwright(
     headers: dict | None,
     timeout_ms: int = 30000,
     context_mode: dict[str, Any] | None = None,
+    cdp_url: str | None = None,
 ) -> tuple[float | None, float | None, ]:
     """
     Открывает url в Playwright/Chromium и возвращает DNS/TCP тайминги навигации
     из performance.getEntriesByType('navigation')[0].
+    Если передан cdp_url, подключается к браузеру пула (connect_over_cdp) в новом контексте
+    и закрывает только этот контекст; иначе запускает свой браузер.
     Возвращает (dns_ms, tcp_ms); при ошибке — (None, None).
     """
     try:
@@ -65,7 +84,11 @@ def _get_navigation_timings_playwright(
             launch_options["executable_path"] = chrome_path
 
         with sync_playwright() as p:
-            browser = p.chromium.launch(**launch_options)
+            if cdp_url:
+                browser = p.chromium.connect_over_cdp(cdp_url)
+            else:
+                browser = p.chromium.launch(**launch_options)
+            context = None
             try:
                 context = browser.new_context(**context_mode)
                 logger.info(
@@ -101,18 +124,99 @@ def _get_navigation_timings_playwright(
                     tcp_ms = float(tcp_ms)
                 return (dns_ms, tcp_ms)
             finally:
-                browser.close()
+                if cdp_url:
+                    # Браузер пула не закрываем: закрываем только свой контекст и отключаемся
+                    if context is not None:
+                        context.close()
+                else:
+                    browser.close()
     except Exception as e:
         logger.warning("Playwright navigation timings failed: %s", e)
         return (None, None)
 
 
-def _run_once(cmd: list[str], timeout_sec: int) -> dict[str, Any]:
-    """Одиночный запуск lighthouse (с ретраями от tenacity)."""
-    lighthouse_stats = subprocess.run(
-        cmd, capture_output=True, text=True, check=True, timeout=timeout_sec
-    )
-    return json.loads(lighthouse_stats.stdout)
+def _get_navigation_timings_devtools(devtools_log_path: str | None) -> tuple[float | None, float | None]:
+    """
+    Достаёт DNS/TCP тайминги основного документа из devtools-лога Lighthouse (--save-assets):
+    response.timing события Network.responseReceived для первого запроса типа Document.
+    Как и в Navigation Timing, переиспользованное соединение/закэшированный DNS дают 0.
+    Возвращает (dns_ms, tcp_ms); если лог или тайминги недоступны — (None, None).
+    """
+    if not devtools_log_path:
+        return (None, None)
+    try:
+        # Лог — массив событий на десятки мегабайт: читаем по одному событию
+        with open(devtools_log_path, "rb") as f:
+            return _document_timings(ijson.items(f, "item", use_float=True))
+    except (OSError, ValueError, ijson.JSONError) as e:
+        logger.warning("Failed to read Lighthouse devtools log %s: %s", devtools_log_path, e)
+        return (None, None)
+
+
+def _document_timings(events) -> tuple[float | None, float | None]:
+    document_request_id = None
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        method = event.get("method")
+        params = event.get("params") or {}
+        if method == "Network.requestWillBeSent" and document_request_id is None and params.get("type") == "Document":
+            document_request_id = params.get("requestId")
+        elif method == "Network.responseReceived" and document_request_id is not None and params.get("requestId") == document_request_id:
+            timing = (params.get("response") or {}).get("timing")
+            if not timing:
+                return (None, None)
+
+            def span(start_key: str, end_key: str) -> float | None:
+                start, end = timing.get(start_key), timing.get(end_key)
+                if start is None or end is None:
+                    return None
+                if start < 0 or end < 0:
+                    return 0.0
+                return float(end - start)
+
+            return (span("dnsStart", "dnsEnd"), span("connectStart", "connectEnd"))
+    return (None, None)
+
+
+def _find_devtools_log(output_dir: str) -> str | None:
+    for name in os.listdir(output_dir):
+        if name.endswith(".devtoolslog.json"):
+            return os.path.join(output_dir, name)
+    return None
+
+
+def _audit_numeric_values(report_path: str) -> dict[str, Any]:
+    """
+    numericValue аудитов отчёта: {аудит: значение}. Отчёт разбирается событиями ijson,
+    сами аудиты (details, скриншоты) не собираются в объекты.
+    """
+    values = {}
+    with open(report_path, "rb") as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if event != "number" or not prefix.startswith("audits.") or not prefix.endswith(".numericValue"):
+                continue
+            audit_id = prefix[len("audits."):-len(".numericValue")]
+            if "." not in audit_id:
+                values[audit_id] = value
+    return values
+
+
+def _run_once(cmd: list[str], timeout_sec: int, report_path: str) -> dict[str, Any]:
+    """
+    Одиночный запуск lighthouse (с ретраями от tenacity) под надзором lighthouse.supervisor:
+    своя группа процессов, лимиты памяти/CPU, по таймауту завершается всё дерево процессов.
+    stdout не нужен (отчёт пишется в report_path), от stderr хранятся последние STDERR_TAIL_LINES строк.
+    Возвращает numericValue аудитов: {аудит: значение}; из отчёта больше ничего не загружается.
+    """
+    run_supervised(cmd, timeout_sec, STDERR_TAIL_LINES)
+    try:
+        values = _audit_numeric_values(report_path)
+    except ijson.JSONError as e:
+        raise json.JSONDecodeError(f"Invalid Lighthouse report: {e}", "", 0) from e
+    if not values:
+        raise json.JSONDecodeError("Lighthouse report has no audits", "", 0)
+    return values
 
 
 def _get_modes_from_metadata(metadata: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
@@ -126,6 +230,10 @@ def _get_modes_from_metadata(metadata: dict[str, Any]) -> tuple[dict[str, Any],
     - lighthouse_mobile: bool (приоритет выше lighthouse_device)
     - lighthouse_viewport: {"width": int, "height": int, "deviceScaleFactor"?: int|float, "dpr"?: int|float}
     - lighthouse_cpuSlowdownMultiplier: int|float
+    - lighthouse_samples: int — сколько прогонов делать за проверку (по умолчанию 1, не больше MAX_SAMPLES)
+    - lighthouse_samples_cv: float — порог коэффициента вариации для досрочной остановки (по умолчанию 0.05)
+    - lighthouse_playwright_timings: bool — дополнительно открыть страницу в Playwright,
+      если DNS/TCP не удалось получить из devtools-лога Lighthouse (по умолчанию выключено)
     """
     lighthouse_device_raw = metadata.get("lighthouse_device")
     lighthouse_mobile_raw = metadata.get("lighthouse_mobile")
@@ -192,6 +300,13 @@ def run_lighthouse(
 ) -> dict[str, Any]:
     """
     Запускает Lighthouse CLI для url и возвращает структурированный результат.
+    Каждый прогон выполняется на отдельно арендованном браузере из пула (lighthouse.browser_pool),
+    если пул доступен; иначе Lighthouse запускает свой Chrome.
+
+    При lighthouse_samples > 1 в metadata делается несколько прогонов подряд; в metrics
+    пишутся медианы (под прежними ключами), {metric}_p75 и {metric}_spread (max - min) и samples.
+    Прогоны останавливаются досрочно, когда после MIN_SAMPLES_FOR_EARLY_STOP прогонов
+    коэффициент вариации основных метрик не превышает lighthouse_samples_cv.
 
     Args:
         url: ссылка на ресурс
@@ -203,6 +318,85 @@ def run_lighthouse(
         dict с ключами: @timestamp, status, metadata, url, metrics, error, message.
         metrics: {fcp_ms, fcp_s, tbt_ms, tbt_s, si_ms, si_s, lcp_ms, lcp_s, cls, dns_ms, dns_s, tcp_ms, tcp_s}.
     """
+    samples, max_cv = _get_samples_from_metadata(metadata or {})
+    successful = []
+    result = {}
+    for _ in range(samples):
+        # Каждый сэмпл — на свежем браузере: кэш DNS и соединения прошлого прогона не искажают DNS/TCP
+        with lease_browser() as browser:
+            if browser is not None and hasattr(os, "sched_getaffinity"):
+                # Браузер пула запущен раньше: привязываем его к ядрам текущего слота
+                pin_process_tree(browser.process.pid, os.sched_getaffinity(0))
+            result = _run_lighthouse(url, metadata, timeout_sec, headers, browser)
+            if result.get("status") != "success" and browser is not None:
+                # После неудачного прогона браузер пула перезапускается
+                browser.mark_broken()
+        if result.get("status") != "success":
+            break
+        successful.append(result)
+        if len(successful) >= MIN_SAMPLES_FOR_EARLY_STOP and _is_stable(successful, max_cv):
+            break
+
+    if samples == 1 or not successful:
+        return result
+    if len(successful) < samples:
+        logger.info("Lighthouse samples for %s: %s of %s", url, len(successful), samples)
+    aggregated = dict(successful[-1])
+    aggregated["metrics"] = _aggregate_metrics([sample["metrics"] for sample in successful])
+    return aggregated
+
+
+def _get_samples_from_metadata(metadata: dict[str, Any]) -> tuple[int, float]:
+    samples = metadata.get("lighthouse_samples", 1)
+    if not isinstance(samples, int) or isinstance(samples, bool) or samples < 1:
+        samples = 1
+    max_cv = metadata.get("lighthouse_samples_cv", DEFAULT_SAMPLES_CV)
+    if not isinstance(max_cv, (int, float)) or max_cv < 0:
+        max_cv = DEFAULT_SAMPLES_CV
+    return min(samples, MAX_SAMPLES), float(max_cv)
+
+
+def _is_stable(samples: list[dict[str, Any]], max_cv: float) -> bool:
+    """Коэффициент вариации каждой из STABILITY_METRICS не превышает max_cv."""
+    for key in STABILITY_METRICS:
+        values = [sample["metrics"].get(key) for sample in samples]
+        values = [value for value in values if value is not None]
+        if len(values) < 2:
+            continue
+        mean = statistics.fmean(values)
+        if mean and statistics.stdev(values) / mean > max_cv:
+            return False
+    return True
+
+
+def _aggregate_metrics(samples: list[dict[str, Any]]) -> dict[str, Any]:
+    """Медиана, p75 и разброс по каждой метрике нескольких прогонов."""
+    metrics: dict[str, Any] = {"samples": len(samples)}
+    for key in SAMPLE_METRICS:
+        values = sorted(sample[key] for sample in samples if sample.get(key) is not None)
+        if not values:
+            metrics[key] = None
+            metrics[f"{key}_p75"] = None
+            metrics[f"{key}_spread"] = None
+            if key.endswith("_ms"):
+                metrics[f"{key[:-3]}_s"] = None
+            continue
+        metrics[key] = statistics.median(values)
+        metrics[f"{key}_p75"] = percentile(values, 0.75)
+        metrics[f"{key}_spread"] = values[-1] - values[0]
+        if key.endswith("_ms"):
+            metrics[f"{key[:-3]}_s"] = round(metrics[key] / 1000, 2)
+    return metrics
+
+
+def _run_lighthouse(
+    url: str,
+    metadata: dict[str, Any] | None,
+    timeout_sec: int,
+    headers: dict | None,
+    browser: PooledBrowser | None,
+) -> dict[str, Any]:
+    """Один прогон Lighthouse; browser — браузер пула или None (Lighthouse запускает свой Chrome)."""
     metadata = metadata or {}
     headers = headers or {}
     tmp_path = None
@@ -219,6 +413,9 @@ def run_lighthouse(
 
     # Флаги для headless в контейнере: --no-sandbox, --disable-gpu
     user_data_dir = f"/tmp/chrome-profile-{uuid.uuid4().hex}"
+    # Отчёт и devtools-лог (--save-assets) пишутся во временный каталог
+    output_dir = tempfile.mkdtemp(prefix="lighthouse-")
+    report_path = os.path.join(output_dir, "report.json")
     chrome_flags = f"--headless --no-sandbox --disable-cache --user-data-dir={user_data_dir} --disable-gpu"
     base_cmd = [
         "lighthouse",
@@ -231,9 +428,10 @@ def run_lighthouse(
         f"--screenEmulation.deviceScaleFactor={device_scale_factor}",
         f"--screenEmulation.mobile={mobile_lh_flag}",
         f"--throttling.cpuSlowdownMultiplier={cpu_slowdown}",
-        f"--chrome-flags={chrome_flags}",
         "--output=json",
-        "--output-path=stdout",
+        f"--output-path={report_path}",
+        "--save-assets",
+        "--disable-full-page-screenshot",
         "--only-audits=first-contentful-paint,total-blocking-time,speed-index,largest-contentful-paint,cumulative-layout-shift",
     ]
     logger.info(
@@ -245,9 +443,14 @@ def run_lighthouse(
         height,
         device_scale_factor,
     )
-    chrome_path = os.environ.get("CHROME_PATH")
-    if chrome_path:
-        base_cmd.append(f"--chrome-path={chrome_path}")
+    if browser is not None:
+        # Подключаемся к браузеру пула вместо запуска нового
+        base_cmd.append(f"--port={browser.port}")
+    else:
+        base_cmd.append(f"--chrome-flags={chrome_flags}")
+        chrome_path = os.environ.get("CHROME_PATH")
+        if chrome_path:
+            base_cmd.append(f"--chrome-path={chrome_path}")
 
     @retry(
         stop=stop_after_attempt(3),
@@ -258,7 +461,7 @@ def run_lighthouse(
         reraise=True,
     )
     def run_cmd():
-        return _run_once(base_cmd, timeout_sec)
+        return _run_once(base_cmd, timeout_sec, report_path)
 
     try:
         if headers:
@@ -270,20 +473,26 @@ def run_lighthouse(
             logger.info("Created temporary headers file: %s", tmp_path)
             base_cmd.append(f"--extra-headers={tmp_path}")
 
-        data = run_cmd()
+        values = run_cmd()
 
-        fcb = _safe_metric(data["audits"], "first-contentful-paint")
-        tbt = _safe_metric(data["audits"], "total-blocking-time")
-        si = _safe_metric(data["audits"], "speed-index")
-        lcp = _safe_metric(data["audits"], "largest-contentful-paint")
-        cls = _safe_metric(data["audits"], "cumulative-layout-shift")
+        fcb = _safe_metric(values, "first-contentful-paint")
+        tbt = _safe_metric(values, "total-blocking-time")
+        si = _safe_metric(values, "speed-index")
+        lcp = _safe_metric(values, "largest-contentful-paint")
+        cls = _safe_metric(values, "cumulative-layout-shift")
 
-        dns_ms, tcp_ms = _get_navigation_timings_playwright(
-            url,
-            headers or None,
-            timeout_ms=30000,
-            context_mode=playwright_mode,
-        )
+        # DNS/TCP берём из того же прогона; Playwright (второй заход на страницу) — только по опции
+        dns_ms, tcp_ms = _get_navigation_timings_devtools(_find_devtools_log(output_dir))
+        if (dns_ms is None or tcp_ms is None) and metadata.get("lighthouse_playwright_timings") is True:
+            pw_dns_ms, pw_tcp_ms = _get_navigation_timings_playwright(
+                url,
+                headers or None,
+                timeout_ms=30000,
+                context_mode=playwright_mode,
+                cdp_url=browser.cdp_url if browser is not None else None,
+            )
+            dns_ms = dns_ms if dns_ms is not None else pw_dns_ms
+            tcp_ms = tcp_ms if tcp_ms is not None else pw_tcp_ms
         metrics = {
             "fcp_ms": fcb,
             "fcp_s": round(fcb / 1000, 2) if fcb is not None else None,
@@ -391,5 +600,6 @@ def run_lighthouse(
                 logger.info("Removed temporary headers file: %s", tmp_path)
             except OSError as e:
                 logger.warning("Failed to remove temporary file %s: %s", tmp_path, e)
-        # Удаляем временный профиль Chrome
+        # Удаляем временный профиль Chrome и каталог с отчётом
         shutil.rmtree(user_data_dir, ignore_errors=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
@@ -0,0 +1,166 @@
+"""
+Слоты для одновременных прогонов Lighthouse на хосте.
+
+Метрики Lighthouse (особенно TBT) чувствительны к конкуренции за CPU, поэтому число одновременных
+прогонов ограничено числом слотов: LIGHTHOUSE_MAX_CONCURRENCY или, если 0, автоматически —
+по доступным ядрам (affinity и квота cgroup, LIGHTHOUSE_CPUS_PER_RUN на прогон) и памяти
+(LIGHTHOUSE_MEMORY_PER_RUN_MB на прогон).
+
+Слот — файловая блокировка (flock) в LIGHTHOUSE_SLOT_DIR, поэтому лимит общий для всех процессов
+воркеров на хосте (в контейнере), а слот освобождается и при падении процесса. На время прогона
+процесс воркера (и запускаемые им Lighthouse/Chrome) привязывается к своему набору ядер слота.
+"""
+import os
+import fcntl
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Slot:
+    index: int
+    cpus: frozenset[int]
+    fd: int
+
+
+def _allowed_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _cgroup_cpu_limit() -> float | None:
+    """Квота CPU из cgroup v2 (cpu.max) в ядрах или None, если квоты нет."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return int(quota) / int(period)
+
+
+def _meminfo_mb(key: str) -> int | None:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith(f"{key}:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def slot_count() -> int:
+    """Сколько прогонов Lighthouse может выполняться на хосте одновременно."""
+    configured = getattr(settings, "LIGHTHOUSE_MAX_CONCURRENCY", 0)
+    if configured > 0:
+        return configured
+
+    cpus_per_run = max(getattr(settings, "LIGHTHOUSE_CPUS_PER_RUN", 2), 1)
+    cores = len(_allowed_cpus())
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        cores = min(cores, int(quota))
+    by_cpu = cores // cpus_per_run
+
+    memory_per_run = getattr(settings, "LIGHTHOUSE_MEMORY_PER_RUN_MB", 1024)
+    total_memory = _meminfo_mb("MemTotal")
+    by_memory = total_memory // memory_per_run if total_memory and memory_per_run > 0 else by_cpu
+
+    return max(min(by_cpu, by_memory), 1)
+
+
+def _slot_cpus(index: int) -> frozenset[int]:
+    """Ядра слота: непересекающиеся наборы по LIGHTHOUSE_CPUS_PER_RUN, если ядер хватает."""
+    allowed = _allowed_cpus()
+    per_run = max(getattr(settings, "LIGHTHOUSE_CPUS_PER_RUN", 2), 1)
+    chunk = allowed[index * per_run:(index + 1) * per_run]
+    return frozenset(chunk or allowed)
+
+
+def _memory_available() -> bool:
+    available = _meminfo_mb("MemAvailable")
+    required = getattr(settings, "LIGHTHOUSE_MEMORY_PER_RUN_MB", 1024)
+    return available is None or available >= required
+
+
+def try_acquire_slot() -> Slot | None:
+    """Занимает свободный слот без ожидания; None — все слоты заняты или не хватает памяти."""
+    if not _memory_available():
+        logger.info("No Lighthouse slot: not enough available memory")
+        return None
+    slot_dir = getattr(settings, "LIGHTHOUSE_SLOT_DIR", "/tmp/lighthouse-slots")
+    os.makedirs(slot_dir, exist_ok=True)
+    for index in range(slot_count()):
+        fd = os.open(os.path.join(slot_dir, f"slot-{index}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return Slot(index=index, cpus=_slot_cpus(index), fd=fd)
+    return None
+
+
+def release_slot(slot: Slot) -> None:
+    fcntl.flock(slot.fd, fcntl.LOCK_UN)
+    os.close(slot.fd)
+
+
+def child_pids(pid: int) -> list[int]:
+    """PID прямых потомков процесса (по ppid из /proc/*/stat)."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Поле 4 — ppid; имя процесса (поле 2) может содержать пробелы, поэтому режем по ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def pin_process_tree(pid: int, cpus) -> None:
+    """Привязывает процесс и всех его потомков к ядрам cpus (например, браузер пула к ядрам слота)."""
+    if not hasattr(os, "sched_setaffinity") or not cpus:
+        return
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            os.sched_setaffinity(current, cpus)
+        except OSError:
+            continue
+        pending.extend(child_pids(current))
+
+
+@contextmanager
+def lighthouse_slot():
+    """
+    Занимает слот и привязывает текущий процесс к его ядрам на время блока.
+    Отдаёт Slot или None, если свободного слота нет (вызывающий откладывает прогон).
+    """
+    slot = try_acquire_slot()
+    if slot is None:
+        yield None
+        return
+    original_cpus = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else None
+    try:
+        if original_cpus is not None:
+            os.sched_setaffinity(0, slot.cpus)
+        yield slot
+    finally:
+        if original_cpus is not None:
+            os.sched_setaffinity(0, original_cpus)
+        release_slot(slot)
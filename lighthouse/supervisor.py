@@ -0,0 +1,333 @@
+"""
+Запуск Lighthouse CLI под надзором: лимиты ресурсов, гарантированное завершение всего дерева
+процессов и уборка того, что осталось от убитых воркеров.
+
+- Lighthouse стартует в собственной сессии (start_new_session): по таймауту сигнал получает вся
+  группа процессов, а также потомки, ушедшие в свои сессии (Chrome от chrome-launcher запускается
+  detached) — их дерево снимается по /proc до сигнала.
+- Лимиты: если есть доступный на запись cgroup v2 с контроллером memory (LIGHTHOUSE_CGROUP_ROOT или cgroup
+  воркера), прогон получает дочерний cgroup с memory.max = LIGHTHOUSE_MEMORY_LIMIT_MB и
+  cpu.max = LIGHTHOUSE_CPU_LIMIT ядер; по завершении все процессы cgroup убиваются, а сам он удаляется.
+  Иначе — rlimit: RLIMIT_CPU (процессорное время на процесс) и, если задан, RLIMIT_AS
+  (LIGHTHOUSE_RLIMIT_AS_MB; V8 резервирует много виртуальной памяти, поэтому по умолчанию выключен).
+  Лимиты применяет не preexec_fn (Python между fork и exec небезопасен в процессе с потоками),
+  а обёртка /bin/sh (LIMITS_WRAPPER): shell переносит себя в cgroup или выставляет ulimit и делает exec
+  команды, поэтому Lighthouse и его потомки стартуют уже под лимитами.
+- При старте воркера (worker_init) sweep_orphans убивает Chrome/Lighthouse, оставшиеся без родителя
+  (ppid 1), и удаляет брошенные профили /tmp/chrome-profile-* и каталоги отчётов /tmp/lighthouse-*.
+  Профили живых пулов браузеров (lighthouse.browser_pool) и используемые живыми процессами не трогаются.
+"""
+import os
+import time
+import errno
+import uuid
+import shutil
+import signal
+import logging
+import tempfile
+import threading
+import subprocess
+from collections import deque
+
+from celery.signals import worker_init
+from django.conf import settings
+
+from lighthouse.slots import child_pids
+
+logger = logging.getLogger(__name__)
+
+CGROUP_FS = "/sys/fs/cgroup"
+# Сколько ждать завершения после SIGTERM, прежде чем послать SIGKILL, сек
+TERMINATE_GRACE = 5
+# Профили и каталоги отчётов моложе этого возраста не удаляются (их может создавать соседний воркер), сек
+SWEEP_MIN_AGE = 3600
+
+PROFILE_PREFIX = "chrome-profile-"
+POOL_PROFILE_PREFIX = "chrome-profile-pool-"
+REPORT_PREFIX = "lighthouse-"
+
+
+def _own_cgroup() -> str | None:
+    try:
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return os.path.join(CGROUP_FS, line.strip()[3:].lstrip("/"))
+    except OSError:
+        pass
+    return None
+
+
+def _write(path: str, value: str) -> None:
+    with open(path, "w") as f:
+        f.write(value)
+
+
+def create_cgroup() -> str | None:
+    """Дочерний cgroup v2 с лимитами памяти и CPU для одного прогона или None, если cgroup недоступен."""
+    memory_mb = getattr(settings, "LIGHTHOUSE_MEMORY_LIMIT_MB", 0)
+    cpu_limit = getattr(settings, "LIGHTHOUSE_CPU_LIMIT", 0)
+    if memory_mb <= 0 and cpu_limit <= 0:
+        return None
+    base = getattr(settings, "LIGHTHOUSE_CGROUP_ROOT", "") or _own_cgroup()
+    if not base or not os.access(base, os.W_OK):
+        return None
+    try:
+        with open(os.path.join(base, "cgroup.subtree_control")) as f:
+            controllers = f.read().split()
+    except OSError:
+        return None
+    if "memory" not in controllers:
+        return None
+
+    path = os.path.join(base, f"lighthouse-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    try:
+        os.mkdir(path)
+        if memory_mb > 0:
+            _write(os.path.join(path, "memory.max"), str(memory_mb * 1024 * 1024))
+            if os.path.exists(os.path.join(path, "memory.swap.max")):
+                _write(os.path.join(path, "memory.swap.max"), "0")
+        if cpu_limit > 0 and "cpu" in controllers:
+            _write(os.path.join(path, "cpu.max"), f"{int(cpu_limit * 100000)} 100000")
+    except OSError as e:
+        logger.warning("Cannot set up cgroup for Lighthouse, falling back to rlimits: %s", e)
+        remove_cgroup(path)
+        return None
+    return path
+
+
+def _cgroup_pids(path: str) -> list[int]:
+    try:
+        with open(os.path.join(path, "cgroup.procs")) as f:
+            return [int(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return []
+
+
+def remove_cgroup(path: str) -> None:
+    """Убивает все процессы cgroup и удаляет его."""
+    if not os.path.isdir(path):
+        return
+    try:
+        _write(os.path.join(path, "cgroup.kill"), "1")
+    except OSError:
+        # cgroup.kill появился в ядре 5.14
+        for pid in _cgroup_pids(path):
+            _signal(pid, signal.SIGKILL)
+    deadline = time.monotonic() + TERMINATE_GRACE
+    while True:
+        try:
+            os.rmdir(path)
+            return
+        except OSError as e:
+            if time.monotonic() >= deadline:
+                logger.warning("Failed to remove Lighthouse cgroup %s: %s", path, e)
+                return
+            time.sleep(0.05)
+
+
+# Аргументы: cgroup (или пустая строка), мягкий и жёсткий RLIMIT_CPU в секундах, RLIMIT_AS в КБ (0 — без лимита),
+# затем команда. echo — встроенная команда shell, поэтому "0" в cgroup.procs переносит сам shell.
+LIMITS_WRAPPER = """
+cgroup="$1"; cpu_soft="$2"; cpu_hard="$3"; as_kb="$4"; shift 4
+if [ -z "$cgroup" ] || ! { echo 0 > "$cgroup/cgroup.procs"; } 2>/dev/null; then
+    ulimit -S -t "$cpu_soft" && ulimit -H -t "$cpu_hard" || exit 126
+    if [ "$as_kb" -gt 0 ]; then ulimit -v "$as_kb" || exit 126; fi
+fi
+exec "$@"
+"""
+
+
+def _with_limits(cmd: list[str], cgroup_path: str | None, cpu_seconds: int) -> list[str]:
+    """Команда в обёртке /bin/sh, которая до exec переносит процесс в cgroup или выставляет rlimit."""
+    as_mb = getattr(settings, "LIGHTHOUSE_RLIMIT_AS_MB", 0)
+    as_kb = as_mb * 1024 if as_mb > 0 else 0
+    return [
+        "/bin/sh", "-c", LIMITS_WRAPPER, "lighthouse-limits",
+        cgroup_path or "", str(cpu_seconds), str(cpu_seconds + 5), str(as_kb),
+        *cmd,
+    ]
+
+
+def _signal(pid: int, sig: int) -> None:
+    try:
+        os.kill(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _signal_group(pgid: int, sig: int) -> None:
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _descendants(pid: int) -> list[int]:
+    result = []
+    pending = child_pids(pid)
+    while pending:
+        current = pending.pop()
+        result.append(current)
+        pending.extend(child_pids(current))
+    return result
+
+
+def kill_process_tree(process: subprocess.Popen) -> None:
+    """Завершает процесс, его группу и всех потомков (в том числе ушедших в свою сессию)."""
+    descendants = _descendants(process.pid)
+    _signal_group(process.pid, signal.SIGTERM)
+    for pid in descendants:
+        _signal(pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=TERMINATE_GRACE)
+    except subprocess.TimeoutExpired:
+        pass
+    _signal_group(process.pid, signal.SIGKILL)
+    for pid in descendants:
+        _signal(pid, signal.SIGKILL)
+    process.wait()
+
+
+def run_supervised(cmd: list[str], timeout_sec: int, stderr_lines: int) -> str:
+    """
+    Запускает команду под надзором и ждёт её завершения.
+    stdout отбрасывается, от stderr хранятся последние stderr_lines строк — они возвращаются.
+    По таймауту убивает всё дерево процессов и бросает subprocess.TimeoutExpired,
+    при ненулевом коде возврата — subprocess.CalledProcessError.
+    """
+    # Команду запускает обёртка /bin/sh: отсутствие бинарника проверяем до запуска, как его проверил бы Popen
+    if shutil.which(cmd[0]) is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), cmd[0])
+    cpu_limit = getattr(settings, "LIGHTHOUSE_CPU_LIMIT", 0)
+    cpu_seconds = int(timeout_sec * max(cpu_limit, 1)) + 1
+    cgroup_path = create_cgroup()
+    stderr_tail: deque[str] = deque(maxlen=stderr_lines)
+    try:
+        process = subprocess.Popen(
+            _with_limits(cmd, cgroup_path, cpu_seconds),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            start_new_session=True,
+        )
+        reader = threading.Thread(target=stderr_tail.extend, args=(process.stderr,), daemon=True)
+        reader.start()
+        try:
+            returncode = process.wait(timeout=timeout_sec)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(process)
+            raise subprocess.TimeoutExpired(cmd, timeout_sec, stderr="".join(stderr_tail))
+        finally:
+            # Остатки группы (дочерние процессы, не завершившиеся вместе с Lighthouse)
+            _signal_group(process.pid, signal.SIGKILL)
+            reader.join(timeout=5)
+            process.stderr.close()
+    finally:
+        if cgroup_path:
+            remove_cgroup(cgroup_path)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd, output="", stderr="".join(stderr_tail))
+    return "".join(stderr_tail)
+
+
+def _read_proc(pid: str) -> tuple[int, list[str]] | None:
+    """ppid и argv процесса или None, если процесс недоступен."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            argv = f.read().decode(errors="replace").split("\0")
+    except (OSError, ValueError, IndexError):
+        return None
+    return ppid, argv
+
+
+def _user_data_dir(argv: list[str]) -> str | None:
+    for arg in argv:
+        if arg.startswith("--user-data-dir="):
+            return arg.split("=", 1)[1]
+    return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _pool_owner_alive(name: str) -> bool:
+    """Жив ли процесс-владелец профиля пула chrome-profile-pool-{pid}-..."""
+    try:
+        return _pid_alive(int(name[len(POOL_PROFILE_PREFIX):].split("-", 1)[0]))
+    except ValueError:
+        return False
+
+
+def _is_orphan_browser(argv: list[str]) -> bool:
+    command = " ".join(argv)
+    profile = _user_data_dir(argv) or ""
+    if os.path.basename(profile).startswith(POOL_PROFILE_PREFIX) and _pool_owner_alive(os.path.basename(profile)):
+        return False
+    return f"/{PROFILE_PREFIX}" in profile or "lighthouse" in os.path.basename(argv[0]) or "bin/lighthouse" in command
+
+
+def sweep_orphans(now: float | None = None) -> tuple[int, int]:
+    """
+    Убивает осиротевшие (ppid 1) процессы Chrome/Lighthouse и удаляет брошенные профили и каталоги отчётов.
+    Возвращает (число убитых процессов, число удалённых каталогов).
+    """
+    now = now or time.time()
+    killed = 0
+    in_use = set()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        info = _read_proc(entry)
+        if info is None:
+            continue
+        ppid, argv = info
+        if ppid == 1 and _is_orphan_browser(argv):
+            _signal(int(entry), signal.SIGKILL)
+            killed += 1
+            continue
+        profile = _user_data_dir(argv)
+        if profile:
+            in_use.add(os.path.realpath(profile))
+
+    tmp_dir = tempfile.gettempdir()
+    slot_dir = os.path.realpath(getattr(settings, "LIGHTHOUSE_SLOT_DIR", "/tmp/lighthouse-slots"))
+    removed = 0
+    for name in os.listdir(tmp_dir):
+        path = os.path.realpath(os.path.join(tmp_dir, name))
+        if not os.path.isdir(path) or path in in_use or path == slot_dir:
+            continue
+        if name.startswith(POOL_PROFILE_PREFIX):
+            stale = not _pool_owner_alive(name)
+        elif name.startswith(PROFILE_PREFIX) or name.startswith(REPORT_PREFIX):
+            try:
+                stale = now - os.path.getmtime(path) > SWEEP_MIN_AGE
+            except OSError:
+                continue
+        else:
+            continue
+        if stale:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+
+    if killed or removed:
+        logger.info("Lighthouse sweep: killed %s orphaned process(es), removed %s stale dir(s)", killed, removed)
+    return killed, removed
+
+
+@worker_init.connect
+def _sweep_on_worker_start(**kwargs):
+    try:
+        sweep_orphans()
+    except Exception as e:
+        logger.warning("Lighthouse orphan sweep failed: %s", e)
@@ -1,53 +1,105 @@
+import random
 import logging
-import httpx
-from datetime import datetime, timezone as dt_timezone
+
+from celery.exceptions import MaxRetriesExceededError, Retry
 
 from config.celery import app
 from django.conf import settings
-from django.utils import timezone as dj_timezone
 from lighthouse.models import CheckEvents, CheckListItem, Source
+from lighthouse.dispatch import claim_due_items
 from lighthouse.runner import run_lighthouse
+from lighthouse import elk, metrics, regressions, result_cache
+from lighthouse.slots import lighthouse_slot
 
 logger = logging.getLogger(__name__)
 
-def _get_current_index() -> str:
-    """Возвращает индекс для ELK, используя шаблон из настроек и текущую дату."""
-    elk_index_template = getattr(settings, "ELK_INDEX_TEMPLATE", "lighthouse-results-%Y-%m-%d")
-    return datetime.now(dt_timezone.utc).strftime(elk_index_template)
+# Сколько раз откладывать прогон, если на хосте нет свободного слота Lighthouse
+SLOT_MAX_RETRIES = 120
 
-def _post_to_elk(result: dict) -> None:
-    """Отправляет один результат Lighthouse в ELK, если настроены ELK_*.
-    При DEBUG=True отправка в ELK не выполняется."""
-    if getattr(settings, "DEBUG", False):
-        logger.debug("Skip posting to ELK (DEBUG=True)")
-        return
 
-    elk_url = getattr(settings, "ELK_URL", None)
-    if not elk_url:
-        return
+def _retry_without_slot(task, label: str) -> None:
+    """Откладывает задачу до освобождения слота (с разбросом, чтобы задачи не просыпались разом)."""
+    countdown = getattr(settings, "LIGHTHOUSE_SLOT_RETRY_SECONDS", 30) + random.randint(0, 10)
+    try:
+        raise task.retry(countdown=countdown)
+    except MaxRetriesExceededError:
+        logger.error("No free Lighthouse slot for %s, giving up after %s retries", label, task.max_retries)
+        return None
 
-    elk_url = elk_url.format(index=_get_current_index())  # Подставляем результат в URL, если там есть плейсхолдеры
 
-    elk_user = getattr(settings, "ELK_USER", None)
-    elk_password = getattr(settings, "ELK_PASSWORD", None) or getattr(
-        settings, "ELK_AUTH", None
-    )
-    verify_ssl = getattr(settings, "ELK_VERIFY_SSL", False)
+def _retry_while_shared_run(task, label: str) -> None:
+    """Откладывает задачу, пока идёт одновременный прогон той же конфигурации (lighthouse.result_cache)."""
+    countdown = result_cache.RETRY_INTERVAL + random.randint(0, 3)
+    try:
+        raise task.retry(countdown=countdown)
+    except MaxRetriesExceededError:
+        logger.warning("Concurrent Lighthouse run for %s did not finish after %s retries", label, task.max_retries)
+
+
+def _record_metrics(event: CheckEvents, result: dict) -> None:
+    """
+    Пишет метрики прогона во временные ряды (lighthouse.metrics) и в детектор регрессий
+    (lighthouse.regressions); ошибка не прерывает обработку результата. Результат из кэша
+    не учитывается повторно, только если прогон выполнял тот же источник; другому источнику
+    с тем же URL и конфигурацией метрики записываются как его собственные.
+    """
+    if result.get("cache_hit") and result.get("cache_source_id") == event.source_id:
+        return
+    try:
+        metrics.record_result(event, result)
+    except Exception as e:
+        logger.error("Failed to store Lighthouse metrics for event %s: %s", event.pk, e, exc_info=True)
     try:
-        auth = (elk_user, elk_password) if (elk_user and elk_password) else ("None", "None")
-        with httpx.Client(verify=verify_ssl, timeout=30.0) as client:
-            resp = client.post(elk_url, json=result, auth=auth)
-            resp.raise_for_status()
-            logger.debug("Posted Lighthouse result to ELK: %s", resp.status_code)
+        regressions.observe_result(event, result)
     except Exception as e:
-        logger.warning("Failed to post to ELK: %s", e)
+        logger.error("Failed to check Lighthouse regressions for event %s: %s", event.pk, e, exc_info=True)
 
 
-@app.task
-def run_lighthouse_for_source(source_id: int) -> dict | None:
+def _run_in_slot(task, source: Source, label: str) -> dict | None:
+    """Прогон Lighthouse в свободном слоте (lighthouse.slots); если слота нет — задача откладывается."""
+    with lighthouse_slot() as slot:
+        if slot is None:
+            return _retry_without_slot(task, label)
+        return run_lighthouse(
+            url=source.url,
+            metadata=source.metadata or {},
+            headers=source.headers or {},
+        )
+
+
+def _run_source(task, source: Source, label: str) -> dict | None:
+    """
+    Результат Lighthouse для источника: свежий из кэша (lighthouse.result_cache) или собственный
+    прогон в слоте. Пока идёт одновременный прогон той же конфигурации, задача откладывается.
+    """
+    return result_cache.get_or_run(
+        source.url,
+        source.metadata or {},
+        source.headers or {},
+        lambda: _run_in_slot(task, source, label),
+        lambda: _retry_while_shared_run(task, label),
+        source_id=source.pk,
+    )
+
+
+def _save_result(source: Source, result: dict) -> CheckEvents:
+    """Сохраняет результат в CheckEvents, временные ряды и очередь отправки в ELK."""
+    event = CheckEvents.objects.create(
+        source=source,
+        status=result.get("status"),
+        metrics=result.get("metrics"),
+        error_message=result.get("message"),
+    )
+    _record_metrics(event, result)
+    elk.enqueue_result(result)
+    return event
+
+
+@app.task(bind=True, max_retries=SLOT_MAX_RETRIES)
+def run_lighthouse_for_source(self, source_id: int) -> dict | None:
     """
     Запускает Lighthouse для одного источника и сохраняет результат в CheckEvents.
-    Вызывается вручную в админке Source.
+    Вызывается вручную в админке Source. Если свободного слота нет — откладывается.
     """
     try:
         source = Source.objects.get(pk=source_id)
@@ -55,19 +107,10 @@ def run_lighthouse_for_source(source_id: int) -> dict | None:
         logger.error("Source id=%s not found", source_id)
         return None
 
-    event = CheckEvents.objects.create(source=source)
-    result = run_lighthouse(
-        url=source.url,
-        metadata=source.metadata or {},
-        headers=source.headers or {},
-    )
-    event.status = result.get("status")
-    event.metrics = result.get("metrics")
-    event.error_message = result.get("message")
-    event.save(update_fields=["status", "metrics", "error_message"])
-
-    if getattr(settings, "ELK_URL", None):
-        _post_to_elk(result)
+    result = _run_source(self, source, f"source {source_id}")
+    if result is None:
+        return None
+    _save_result(source, result)
 
     logger.info(
         "Lighthouse run for source %s (%s): status=%s",
@@ -78,36 +121,38 @@ def run_lighthouse_for_source(source_id: int) -> dict | None:
     return result
 
 
+@app.task
+def flush_elk_outbox() -> int:
+    """
+    Периодическая задача: отправляет накопленные результаты Lighthouse в ELK пачками через _bulk.
+    """
+    return elk.flush_outbox()
+
+
 @app.task
 def start_lighthouse_checks():
     """
-    Периодическая задача: находит CheckListItem (lighthouse), готовые к проверке,
+    Периодическая задача: захватывает CheckListItem (lighthouse), готовые к проверке,
     и ставит в очередь по одной задаче на каждый элемент (распараллеливание).
     """
     try:
-        items = list(
-            CheckListItem.objects.filter(
-                is_active=True,
-                source__is_active=True,
-                start_at__lte=dj_timezone.now(),
-            ).all()
-        )
-        for item in items:
-            item.set_next_run()
-            run_lighthouse_for_checklist_item.delay(item.id)
-        if items:
-            logger.info("Scheduled %s lighthouse check task(s)", len(items))
+        item_ids = claim_due_items()
+        for item_id in item_ids:
+            run_lighthouse_for_checklist_item.delay(item_id)
+        if item_ids:
+            logger.info("Scheduled %s lighthouse check task(s)", len(item_ids))
     except Exception as e:
         logger.error(
             "Error in run_scheduled_lighthouse_checks: %s", e, exc_info=True
         )
 
 
-@app.task
-def run_lighthouse_for_checklist_item(item_id: int) -> dict | None:
+@app.task(bind=True, max_retries=SLOT_MAX_RETRIES)
+def run_lighthouse_for_checklist_item(self, item_id: int) -> dict | None:
     """
-    Запускает Lighthouse для одного элемента расписания: создаёт событие,
-    сохраняет результат, обновляет start_at. Вызывается из run_scheduled_lighthouse_checks.
+    Запускает Lighthouse для одного элемента расписания и сохраняет результат в CheckEvents.
+    Вызывается из run_scheduled_lighthouse_checks.
+    Прогон выполняется в слоте (lighthouse.slots); если свободного слота нет — задача откладывается.
     """
     try:
         item = CheckListItem.objects.select_related("source").get(pk=item_id)
@@ -116,21 +161,12 @@ def run_lighthouse_for_checklist_item(item_id: int) -> dict | None:
         return None
 
     source = item.source
-    event = CheckEvents.objects.create(source=source)
     try:
         logger.info("Running lighthouse for checklist item %s (source %s), headers - %s", item_id, source.name, source.headers)
-        result = run_lighthouse(
-            url=source.url,
-            metadata=source.metadata or {},
-            headers=source.headers or {},
-        )
-        event.status = result.get("status")
-        event.metrics = result.get("metrics")
-        event.error_message = result.get("message")
-        event.save(update_fields=["status", "metrics", "error_message"])
-
-        if getattr(settings, "ELK_URL", None):
-            _post_to_elk(result)
+        result = _run_source(self, source, f"checklist item {item_id}")
+        if result is None:
+            return None
+        _save_result(source, result)
 
         logger.info(
             "Lighthouse run for checklist item %s (source %s): status=%s",
@@ -139,6 +175,8 @@ def run_lighthouse_for_checklist_item(item_id: int) -> dict | None:
             result.get("status"),
         )
         return result
+    except Retry:
+        raise
     except Exception as e:
         logger.error(
             "Error processing lighthouse checklist item %s: %s",
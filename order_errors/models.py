@@ -2,12 +2,13 @@ from string import Formatter
 import ast
 import logging
 from django.db import models
-from django.utils import timezone
+
+from config.utils.retention import RetentionPolicy
 
 logger = logging.getLogger(__name__)
 class OrderError(models.Model):
     number = models.IntegerField(primary_key=True)
-    order_date = models.DateTimeField()
+    order_date = models.DateTimeField(db_index=True)
 
     customer_name = models.CharField(max_length=255)
     customer_phone = models.CharField(max_length=64)
@@ -28,17 +29,13 @@ class OrderError(models.Model):
 
     has_been_reissued = models.BooleanField(default=False, help_text="Был ли заказ переоформлен", null=True, blank=True)
 
+    # Хранение (см. utils.clean)
+    retention = RetentionPolicy("order_date", days=2, overridable=True)
+
     class Meta:
         verbose_name = "400я ошибка заказа"
         verbose_name_plural = "400е ошибки заказов"
 
-    def clear_old(self, days: int = 2):
-        """
-        Очищает старые запросы, которые были созданы более days (по дефолту 2) дней назад.
-        """
-        if self.order_date < (timezone.now() - timezone.timedelta(days=days)):
-            self.delete()
-
 
 filter_help_text = """
 <br>Фильтр в формате JSON. <br>Например: {\"number\": [1, 2, 3], \"customer_name\": [\"John\", \"Jane\"]
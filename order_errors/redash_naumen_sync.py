@@ -1,4 +1,5 @@
 import ast
+import json
 import logging
 from datetime import timedelta
 
@@ -19,6 +20,9 @@ PRICE_ERROR = "Невозможно получить цену на товар"
 QUANTITY_ERROR = "Заказанное количество превышает допустимый остаток"
 VALIDATION_ERROR = "Заказ с таким id уже существует"
 
+# Сколько строк результата Redash разбирать за раз
+ROWS_BATCH_SIZE = 500
+
 STORE_RECOMMENDED_ACTIONS_WITH_STORE = "Переоформить заказ на ближайшую к этой ({store_address}) точку доставки"
 STORE_RECOMMENDED_ACTIONS_WITHOUT_STORE = "Просьба выяснить на какую точку пользователь пытался оформить заказ и переоформить его на ближайшую к ней точку доставки"
 PRICE_RECOMMENDED_ACTION = "Просьба переоформить заказ на ближайшую к этой ({store_address}) точку доставки и при необходимости (если остатков нет) подобрать аналог товару"
@@ -65,29 +69,21 @@ class RedashNaumenSync:
             # Нет данных по этому дашборду — возвращаем пустой словарь
             return {}
 
+        orders: dict[str, list[RawOrderError]] = {}
         try:
-            # Ожидаем структуру: result → query_result → data → rows
-            rows = request.result.get("query_result", {}).get("data", {}).get("rows", [])
-        except (AttributeError, TypeError):
+            # Строки result → query_result → data → rows читаются из результата потоково, пачками,
+            # и валидируются в pydantic‑схему RawOrderError (невалидные пропускаются)
+            for batch in request.iter_rows(batch_size=ROWS_BATCH_SIZE, model=RawOrderError):
+                for order_error in batch:
+                    orders.setdefault(order_error.number, []).append(order_error)
+        except (json.JSONDecodeError, OSError, EOFError):
             logger.warning(
                 "Неожиданная структура result у запроса Redash request_id=%s",
-                getattr(request, "id", None),
+                request.job_id,
+                exc_info=True,
             )
             return {}
 
-        orders: dict[str, list[RawOrderError]] = {}
-        for row in rows:
-            try:
-                # Валидируем и приводим строку к pydantic‑схеме RawOrderError
-                order_error = RawOrderError.model_validate(row)
-            except Exception as e:
-                logger.warning("Ошибка валидации строки из Redash: %s", e, exc_info=True)
-                continue
-
-            if order_error.number not in orders:
-                orders[order_error.number] = []
-            orders[order_error.number].append(order_error)
-
         logger.info(
             "Собрано заказов из Redash (dashboard_id=%s): %s",
             dashboard_id,
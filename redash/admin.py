@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from redash.models import RedashStatuses, RedashSQLs, RedashDashboard, RedashRequests
+from redash.models import RedashStatuses, RedashSQLs, RedashDashboard, RedashRequests, ResultBlob
 
 @admin.register(RedashStatuses)
 class RedashStatusesAdmin(admin.ModelAdmin):
@@ -22,5 +22,11 @@ class RedashDashboardAdmin(admin.ModelAdmin):
 
 @admin.register(RedashRequests)
 class RedashRequestsAdmin(admin.ModelAdmin):
-    list_display = ('cource', 'status', 'date_request')
+    list_display = ('cource', 'status', 'date_request', 'result_rows', 'result_size')
     list_filter = ('redash_sql', 'dashboard', 'status')
+
+@admin.register(ResultBlob)
+class ResultBlobAdmin(admin.ModelAdmin):
+    list_display = ('hash', 'size', 'last_used_at')
+    exclude = ('data',)
+    readonly_fields = ('hash', 'size', 'last_used_at')
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class RedashConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'redash'
+
+    def ready(self):
+        # Сброс кэша статусов в памяти процесса (redash.poller)
+        from redash.poller import connect_signals
+        connect_signals()
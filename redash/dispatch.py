@@ -0,0 +1,47 @@
+"""
+Захват дашбордов и SQL запросов Редаша, время запуска которых наступило.
+
+Строки выбираются одним запросом и захватываются через utils.claim, start_at сдвигается
+одним bulk_update в той же транзакции — каждая строка запускается ровно один раз,
+даже если тики beat и задачи планировщика run_scheduler пересекаются.
+Сами запросы в Редаш отправляются после коммита, без блокировок строк.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from redash.models import RedashDashboard, RedashSQLs
+from utils.claim import claim_due, release_lease, LEASE_FIELDS
+from utils.scheduler import notify_changed
+
+logger = logging.getLogger(__name__)
+
+
+def _claim_due(model, domain: str, now=None) -> list:
+    now = now or timezone.now()
+    schedule_memo = {}  # следующий запуск crontab считается один раз на расписание
+    with transaction.atomic():
+        rows = claim_due(
+            model.objects.filter(is_active=True, start_at__lte=now).select_related("crontab"),
+            now,
+        )
+        for row in rows:
+            release_lease(row)
+            next_run = row.get_next_run(now, schedule_memo)
+            if next_run:
+                row.start_at = next_run
+        if rows:
+            model.objects.bulk_update(rows, ["start_at", *LEASE_FIELDS])
+            notify_changed(domain, [row.pk for row in rows])
+    return rows
+
+
+def claim_due_dashboards(now=None) -> list[RedashDashboard]:
+    """Захватывает дашборды, готовые к запуску, и обновляет время их следующего запуска."""
+    return _claim_due(RedashDashboard, "redash_dashboards", now)
+
+
+def claim_due_sqls(now=None) -> list[RedashSQLs]:
+    """Захватывает SQL запросы, готовые к запуску, и обновляет время их следующего запуска."""
+    return _claim_due(RedashSQLs, "redash_sqls", now)
@@ -1,20 +1,36 @@
+import io
+import gzip
+import json
 import uuid
+import random
+import hashlib
 
 from logging import Logger
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
 from django_celery_beat.models import CrontabSchedule
 
 from django.utils import timezone
 from datetime import timedelta
+from typing import Iterator
 
-from api.wrappers.redash import RedashClient
+import ijson
+from pydantic import BaseModel, ValidationError
+
+from api.wrappers.redash import RedashClient, normalize_job_status
 from api.schemas.redash.redash_schemas import StartJobBody, JobStatusResponse, JobResponse, StartSQLQueryBody
 
 from config.utils.time import default_start_at
+from config.utils.schedule import next_run_at
+from config.utils.retention import RetentionPolicy
 
 logger = Logger(__name__)
 
+# Предел показателя степени в задержке опроса (RedashRequests.schedule_poll): 2^16 с запасом больше REDASH_POLL_MAX_DELAY
+MAX_POLL_BACKOFF_EXPONENT = 16
+
 class RedashStatuses(models.Model):
     id = models.SmallIntegerField(primary_key=True)
     description = models.CharField(max_length=255)
@@ -51,6 +67,9 @@ class RedashSQLs(models.Model):
 
     start_at = models.DateTimeField(default=default_start_at,
                                     help_text="Время запуска задачи. (по стандарту через 5 минут от текущего времени)")
+    # Аренда строки воркером при захвате (используется на БД без SELECT ... FOR UPDATE SKIP LOCKED, см. utils.claim)
+    lease_token = models.UUIDField(null=True, blank=True, editable=False)
+    lease_until = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "SQL запрос в Редаше"
@@ -67,30 +86,23 @@ class RedashSQLs(models.Model):
         )
         redash = RedashClient()
         job_response = redash.run_sql_query(body)
-        redash_request = RedashRequests.objects.create(redash_sql=self,
-                                      status=RedashStatuses.objects.get(id=job_response.job.status),
-                                      job_id=job_response.job.id,
-                                      error=job_response.job.error,
-                                      query_result_id=job_response.job.query_result_id,
-                                      result=job_response.job.result)
-        redash_request.save()
-        return redash_request
+        return RedashRequests.start_tracking(job_response, redash_sql=self)
+
+    def get_next_run(self, now=None, memo: dict | None = None):
+        """
+        Возвращает время следующего запуска задачи, не сохраняя его.
+        Если расписание не задано — возвращает None.
+        """
+        return next_run_at(self, now, memo)
 
     def set_next_run(self):
         """
         Задает следующий интервал запуска задачи.
         """
-        
-        if self.crontab:
-            schedule = self.crontab
-            celery_cron = schedule.schedule 
-            now_in_cron_tz = timezone.now().astimezone(schedule.timezone)
-            next_time = celery_cron.remaining_estimate(now_in_cron_tz)
-            if next_time:
-                self.start_at = timezone.now() + next_time
-                self.save(update_fields=["start_at"])
-        else:
-            logger.warning(f"RedashSQLs {self.uuid} has no interval or crontab schedule set.")
+        next_run = self.get_next_run()
+        if next_run:
+            self.start_at = next_run
+            self.save(update_fields=["start_at"])
 
     def start_query_by_crontab(self):
         """
@@ -128,6 +140,9 @@ class RedashDashboard(models.Model):
 
     start_at = models.DateTimeField(default=default_start_at,
                                     help_text="Время запуска задачи. (по стандарту через 5 минут от текущего времени)")
+    # Аренда строки воркером при захвате (используется на БД без SELECT ... FOR UPDATE SKIP LOCKED, см. utils.claim)
+    lease_token = models.UUIDField(null=True, blank=True, editable=False)
+    lease_until = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Дашборд в Редаше"
@@ -150,30 +165,23 @@ class RedashDashboard(models.Model):
         redash = RedashClient()
         job_response = redash.start_dashboard_query(body)
         # Сохраняем результат в RedashRequests
-        redash_request = RedashRequests.objects.create(dashboard=self,
-                                      status=RedashStatuses.objects.get(id=job_response.job.status),
-                                      job_id=job_response.job.id,
-                                      error=job_response.job.error,
-                                      query_result_id=job_response.job.query_result_id,
-                                      result=job_response.job.result)
-        redash_request.save()
-        return redash_request
+        return RedashRequests.start_tracking(job_response, dashboard=self)
     
+    def get_next_run(self, now=None, memo: dict | None = None):
+        """
+        Возвращает время следующего запуска задачи, не сохраняя его.
+        Если расписание не задано — возвращает None.
+        """
+        return next_run_at(self, now, memo)
+
     def set_next_run(self):
         """
         Задает следующий интервал запуска задачи.
         """
-        
-        if self.crontab:
-            schedule = self.crontab
-            celery_cron = schedule.schedule
-            now_in_cron_tz = timezone.now().astimezone(schedule.timezone)
-            next_time = celery_cron.remaining_estimate(now_in_cron_tz)
-            if next_time:
-                self.start_at = timezone.now() + next_time
-                self.save(update_fields=["start_at"])
-        else:
-            logger.warning(f"CheckListItem {self.id} has no interval or crontab schedule set.")
+        next_run = self.get_next_run()
+        if next_run:
+            self.start_at = next_run
+            self.save(update_fields=["start_at"])
 
     def start_query_by_crontab(self):
         """
@@ -187,6 +195,60 @@ class RedashDashboard(models.Model):
         else:
             logger.warning(f"RedashDashboard {self.id} is not active.")
 
+class ResultBlob(models.Model):
+    """
+    Результат запроса в Редаше (тело GET /api/query_results/{id}) вне таблицы запросов:
+    JSON, сжатый gzip, с ключом sha256 от несжатого содержимого. Одинаковые результаты хранятся один раз.
+    """
+    hash = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    size = models.PositiveBigIntegerField(help_text="Размер JSON без сжатия, байт")
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    # Удаляются только результаты, на которые не ссылается ни один запрос (см. utils.clean)
+    retention = RetentionPolicy("last_used_at", days=1, condition=Q(requests__isnull=True))
+
+    class Meta:
+        verbose_name = "Результат запроса в Редаше"
+        verbose_name_plural = "Результаты запросов в Редаше"
+
+    def __str__(self):
+        return f"{self.hash[:12]} ({self.size} B)"
+
+    @staticmethod
+    def encode(result) -> bytes:
+        return json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode()
+
+    @classmethod
+    def store(cls, raw: bytes) -> "ResultBlob":
+        """Сохраняет результат (если такого ещё нет) и отмечает его использование."""
+        now = timezone.now()
+        digest = hashlib.sha256(raw).hexdigest()
+        # Существующий блоб не перезаписываем; last_used_at защищает его от параллельной очистки
+        if not cls.objects.filter(pk=digest).update(last_used_at=now):
+            cls.objects.bulk_create(
+                [cls(hash=digest, data=gzip.compress(raw, mtime=0), size=len(raw), last_used_at=now)],
+                ignore_conflicts=True,
+            )
+        return cls(hash=digest, size=len(raw), last_used_at=now)
+
+    @classmethod
+    def load(cls, digest: str):
+        """Распакованный результат или None, если блоба нет."""
+        data = cls.objects.filter(pk=digest).values_list("data", flat=True).first()
+        if data is None:
+            return None
+        return json.loads(gzip.decompress(data))
+
+    @classmethod
+    def open(cls, digest: str):
+        """Бинарный поток распакованного результата (распаковка идёт по мере чтения) или None, если блоба нет."""
+        data = cls.objects.filter(pk=digest).values_list("data", flat=True).first()
+        if data is None:
+            return None
+        return gzip.GzipFile(fileobj=io.BytesIO(data), mode="rb")
+
+
 class RedashRequests(models.Model):
     """Запущенные запросы в Редаше"""
     redash_sql = models.ForeignKey(RedashSQLs, on_delete=models.CASCADE, null=True)
@@ -197,11 +259,28 @@ class RedashRequests(models.Model):
     error = models.TextField(blank=True, null=True)
     query_result_id = models.IntegerField(blank=True, null=True)
 
-    result = models.JSONField(blank=True, null=True)
+    # Результат хранится в ResultBlob, здесь — только ссылка и сведения о нём (сам результат — свойство result).
+    # DO_NOTHING без внешнего ключа в БД: очистка запросов и блобов не загружает строки в память
+    result_blob = models.ForeignKey(
+        ResultBlob, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="requests"
+    )
+    result_rows = models.IntegerField(blank=True, null=True, help_text="Количество строк результата")
+    result_columns = models.JSONField(blank=True, null=True, help_text="Имена колонок результата")
+    result_size = models.PositiveBigIntegerField(blank=True, null=True, help_text="Размер результата без сжатия, байт")
 
-    date_request = models.DateTimeField(auto_now_add=True)
+    date_request = models.DateTimeField(auto_now_add=True, db_index=True)
     date_update = models.DateTimeField(auto_now=True)
 
+    # Опрос джоба (redash.poller): время следующего опроса и сколько раз джоб уже опрошен
+    next_poll_at = models.DateTimeField(default=timezone.now, db_index=True)
+    poll_attempts = models.PositiveIntegerField(default=0)
+
+    # Хранение истории (см. utils.clean)
+    retention = RetentionPolicy("date_request", days=2, overridable=True)
+
+    # Поля, которые меняет set_result (для save(update_fields=...) и bulk_update)
+    RESULT_FIELDS = ["result_blob", "result_rows", "result_columns", "result_size"]
+
     class Meta:
         verbose_name = "Запущенный запрос в Редаше"
         verbose_name_plural = "Запущенные запросы в Редаше"
@@ -212,6 +291,113 @@ class RedashRequests(models.Model):
         if self.redash_sql:
             return f"ID: {self.job_id}, Dashboard: {self.redash_sql}, Error: {self.error}, Query Result ID: {self.query_result_id}"
     
+    @classmethod
+    def start_tracking(cls, job_response: JobStatusResponse, **source) -> "RedashRequests":
+        """
+        Сохраняет запущенный джоб и после коммита ставит цепочку его опроса (redash.tasks.poll_redash_request).
+        source — dashboard или redash_sql.
+        """
+        redash_request = cls(status=RedashStatuses.objects.get(id=job_response.job.status),
+                             job_id=job_response.job.id,
+                             error=job_response.job.error,
+                             query_result_id=job_response.job.query_result_id,
+                             **source)
+        redash_request.set_result(job_response.job.result)
+        redash_request.schedule_poll()
+        redash_request.save()
+        if not redash_request.status.is_final:
+            # Импорт здесь: tasks импортирует этот модуль
+            from redash.tasks import poll_redash_request
+            countdown = (redash_request.next_poll_at - timezone.now()).total_seconds()
+            transaction.on_commit(
+                lambda: poll_redash_request.apply_async(args=[redash_request.job_id], countdown=max(countdown, 0))
+            )
+        return redash_request
+
+    @property
+    def result(self) -> dict | None:
+        """Тело результата из ResultBlob; загружается при первом обращении."""
+        if not hasattr(self, "_result"):
+            self._result = ResultBlob.load(self.result_blob_id) if self.result_blob_id else None
+        return self._result
+
+    def iter_rows(self, batch_size: int = 500, model: type[BaseModel] | None = None) -> Iterator[list]:
+        """
+        Отдаёт строки результата (query_result.data.rows) пачками не больше batch_size.
+        Сохранённый результат разбирается потоково (ijson), без построения всего документа.
+        Если задана pydantic-модель, строки валидируются в неё; невалидные пропускаются с предупреждением.
+        """
+        if hasattr(self, "_result"):
+            data = ((self._result or {}).get("query_result") or {}).get("data") or {}
+            rows = iter(data.get("rows") or [])
+            stream = None
+        else:
+            stream = ResultBlob.open(self.result_blob_id) if self.result_blob_id else None
+            if stream is None:
+                return
+            rows = ijson.items(stream, "query_result.data.rows.item", use_float=True)
+        try:
+            batch = []
+            for row in rows:
+                if model is not None:
+                    try:
+                        row = model.model_validate(row)
+                    except ValidationError as e:
+                        logger.warning(f"Invalid row in Redash result {self.job_id}: {e}")
+                        continue
+                batch.append(row)
+                if len(batch) >= max(batch_size, 1):
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        except ijson.JSONError as e:
+            raise json.JSONDecodeError(f"Invalid Redash result {self.job_id}: {e}", "", 0) from e
+        finally:
+            if stream is not None:
+                stream.close()
+
+    def set_result(self, result) -> bool:
+        """
+        Сохраняет результат в ResultBlob и обновляет сведения о нём (поля RESULT_FIELDS, без сохранения строки).
+        Результатом считается только тело query_results (dict); остальное очищает результат.
+        Возвращает True, если результат изменился.
+        """
+        if not isinstance(result, dict):
+            changed = self.result_blob_id is not None
+            self.result_blob = None
+            self.result_rows = self.result_columns = self.result_size = None
+            self._result = None
+            return changed
+        raw = ResultBlob.encode(result)
+        if self.result_blob_id == hashlib.sha256(raw).hexdigest():
+            return False
+        self.result_blob = ResultBlob.store(raw)
+        data = (result.get("query_result") or {}).get("data") or {}
+        rows = data.get("rows")
+        columns = data.get("columns")
+        self.result_rows = len(rows) if isinstance(rows, list) else None
+        self.result_columns = (
+            [column.get("name") for column in columns if isinstance(column, dict)] if isinstance(columns, list) else None
+        )
+        self.result_size = len(raw)
+        self._result = result
+        return True
+
+    def schedule_poll(self, now=None):
+        """
+        Назначает следующий опрос: задержка REDASH_POLL_INITIAL_DELAY * 2^попытка, не больше REDASH_POLL_MAX_DELAY,
+        плюс до 10% случайного разброса. Показатель степени ограничен MAX_POLL_BACKOFF_EXPONENT, чтобы у долгих
+        джобов задержка не переполнялась. Поля не сохраняет.
+        """
+        now = now or timezone.now()
+        delay = min(
+            getattr(settings, "REDASH_POLL_INITIAL_DELAY", 2) * 2 ** min(self.poll_attempts, MAX_POLL_BACKOFF_EXPONENT),
+            getattr(settings, "REDASH_POLL_MAX_DELAY", 300),
+        )
+        self.next_poll_at = now + timedelta(seconds=delay + random.uniform(0, delay / 10))
+        self.poll_attempts += 1
+
     def cource(self):
         if self.dashboard:
             return f"Dashboard: {self.dashboard.name}"
@@ -219,13 +405,6 @@ class RedashRequests(models.Model):
             return f"SQL: {self.redash_sql.description}"
         return f"Unknown source"
     
-    def clear_old(self, days: int = 2):
-        """
-        Очищает старые запросы, которые были созданы более days (по дефолту 2) дней назад.
-        """
-        if self.date_request < (timezone.now() - timezone.timedelta(days=days)):
-            self.delete()
-
     def refresh(self):
         """
         Обновляет статус запроса: опрашивает Redash API и при готовности результата подтягивает данные.
@@ -239,17 +418,7 @@ class RedashRequests(models.Model):
             JobStatusResponse(job=JobResponse(id=self.job_id, updated_at=0, status=0, error=None, result=None, query_result_id=None))
         )
         # В ответе jobs API query_result_id может приходить как result (int)
-        if job_status_response.job.query_result_id is None and isinstance(job_status_response.job.result, int):
-            job_status_response = JobStatusResponse(
-                job=JobResponse(
-                    id=job_status_response.job.id,
-                    updated_at=job_status_response.job.updated_at,
-                    status=job_status_response.job.status,
-                    error=job_status_response.job.error,
-                    result=job_status_response.job.result,
-                    query_result_id=job_status_response.job.result,
-                )
-            )
+        job_status_response = normalize_job_status(job_status_response)
         # Подтягиваем полный результат только если джоб завершён и есть query_result_id
         if job_status_response.job.query_result_id:
             job_status_response = redash.get_query_result(job_status_response)
@@ -257,7 +426,7 @@ class RedashRequests(models.Model):
         self.status = RedashStatuses.objects.get(id=job_status_response.job.status)
         self.error = job_status_response.job.error
         self.query_result_id = job_status_response.job.query_result_id
-        self.result = job_status_response.job.result
-        self.save(update_fields=["status", "error", "query_result_id", "result"])
+        self.set_result(job_status_response.job.result)
+        self.save(update_fields=["status", "error", "query_result_id", *self.RESULT_FIELDS])
 
 
@@ -0,0 +1,155 @@
+"""
+Одновременный опрос незавершённых запросов Redash.
+
+refresh_pending выбирает RedashRequests с нефинальным статусом, у которых наступил next_poll_at,
+и опрашивает их джобы в одном event loop: GET /api/jobs/{id} и, если результат готов,
+GET /api/query_results/{id}. Одновременно выполняется не больше REDASH_POLL_CONCURRENCY запросов к Redash.
+Каждый опрошенный джоб получает следующий next_poll_at с экспоненциальной задержкой
+(RedashRequests.schedule_poll): короткие джобы опрашиваются часто, долгие — всё реже.
+
+Каждый джоб ведёт своя цепочка задач poll_redash_request (apply_async с countdown до next_poll_at),
+а периодическая refresh_all_requests подбирает джобы, цепочка которых потерялась.
+Блокировки не держатся на время HTTP-запросов:
+- короткая транзакция выбирает готовые строки (SKIP LOCKED там, где поддерживается) и сдвигает
+  их next_poll_at на POLL_LEASE_SECONDS — аренда, чтобы цепочка и общий проход не опрашивали
+  один джоб одновременно;
+- опрос идёт вне транзакции;
+- ответ каждого джоба применяется в своей транзакции к заново прочитанной и заблокированной строке;
+  ошибка опроса или применения одного джоба не мешает остальным.
+
+Таблица RedashStatuses крошечная и почти не меняется, поэтому держится в памяти процесса;
+кэш сбрасывается сигналами post_save/post_delete модели (connect_signals) и при встрече
+неизвестного статуса.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from api.wrappers.redash import AsyncRedashClient
+from api.schemas.redash.redash_schemas import JobStatusResponse
+from redash.models import RedashRequests, RedashStatuses
+from utils.claim import supports_skip_locked
+
+logger = logging.getLogger(__name__)
+
+# На сколько секунд откладывается next_poll_at опрашиваемых строк (аренда на время опроса)
+POLL_LEASE_SECONDS = 300
+
+_statuses: dict[int, RedashStatuses] | None = None
+
+
+def invalidate_statuses(**kwargs) -> None:
+    global _statuses
+    _statuses = None
+
+
+def get_status(status_id: int) -> RedashStatuses | None:
+    """Статус по id из кэша процесса; неизвестный id перечитывает таблицу один раз."""
+    global _statuses
+    if _statuses is None or status_id not in _statuses:
+        _statuses = {status.id: status for status in RedashStatuses.objects.all()}
+    return _statuses.get(status_id)
+
+
+def connect_signals() -> None:
+    """Сбрасывает кэш статусов при изменении таблицы RedashStatuses."""
+    post_save.connect(invalidate_statuses, sender=RedashStatuses, dispatch_uid="redash_statuses_save")
+    post_delete.connect(invalidate_statuses, sender=RedashStatuses, dispatch_uid="redash_statuses_delete")
+
+
+async def _poll_job(client: AsyncRedashClient, semaphore: asyncio.Semaphore, job_id: str) -> JobStatusResponse:
+    async with semaphore:
+        job_status_response = await client.get_query_status(job_id)
+        # Подтягиваем полный результат только если джоб завершён и есть query_result_id
+        if job_status_response.job.query_result_id:
+            job_status_response = await client.get_query_result(job_status_response)
+        return job_status_response
+
+
+async def _poll_all(job_ids: list[str], concurrency: int) -> list[JobStatusResponse | BaseException]:
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    async with AsyncRedashClient() as client:
+        return await asyncio.gather(
+            *(_poll_job(client, semaphore, job_id) for job_id in job_ids),
+            return_exceptions=True,
+        )
+
+
+def _apply(request: RedashRequests, job_status_response: JobStatusResponse) -> bool:
+    """Переносит ответ Redash в строку. Возвращает True, если строка изменилась."""
+    job = job_status_response.job
+    status = get_status(job.status)
+    if status is None:
+        raise ValueError(f"Unknown Redash job status {job.status}")
+    changed = (
+        request.status_id != status.id
+        or request.error != job.error
+        or request.query_result_id != job.query_result_id
+    )
+    request.status = status
+    request.error = job.error
+    request.query_result_id = job.query_result_id
+    # Сравнение по хэшу: сохранённый результат не загружается
+    return request.set_result(job.result) or changed
+
+
+def _lease_due(now, job_ids: list[str] | None) -> list[RedashRequests]:
+    """Выбирает строки, время опроса которых наступило, и откладывает их next_poll_at на время опроса."""
+    with transaction.atomic():
+        queryset = RedashRequests.objects.filter(status__is_final=False, next_poll_at__lte=now)
+        if job_ids is not None:
+            queryset = queryset.filter(job_id__in=job_ids)
+        if supports_skip_locked(queryset.db):
+            queryset = queryset.select_for_update(skip_locked=True, of=("self",))
+        requests = list(queryset.only("pk", "job_id"))
+        if requests:
+            RedashRequests.objects.filter(pk__in=[request.pk for request in requests]).update(
+                next_poll_at=now + timedelta(seconds=POLL_LEASE_SECONDS)
+            )
+    return requests
+
+
+def _save_response(pk, job_status_response: JobStatusResponse | BaseException, now) -> None:
+    """Применяет ответ Redash к строке под блокировкой и назначает следующий опрос."""
+    with transaction.atomic():
+        request = RedashRequests.objects.select_for_update().filter(pk=pk, status__is_final=False).first()
+        if request is None:
+            # Строку удалили или завершили параллельно (например, RedashRequests.refresh)
+            return
+        request.schedule_poll(now)
+        update_fields = ["next_poll_at", "poll_attempts"]
+        if isinstance(job_status_response, BaseException):
+            logger.error(f"Error refreshing request {request.job_id}: {job_status_response}")
+        else:
+            try:
+                if _apply(request, job_status_response):
+                    request.date_update = now
+                    update_fields += ["status", "error", "query_result_id", *RedashRequests.RESULT_FIELDS, "date_update"]
+            except ValueError as e:
+                logger.error(f"Error refreshing request {request.job_id}: {e}")
+        request.save(update_fields=update_fields)
+
+
+def refresh_pending(now=None, job_ids: list[str] | None = None, concurrency: int | None = None) -> int:
+    """
+    Опрашивает незавершённые запросы Redash, время опроса которых наступило (только job_ids, если заданы).
+    Возвращает количество опрошенных строк.
+    """
+    now = now or timezone.now()
+    if concurrency is None:
+        concurrency = getattr(settings, "REDASH_POLL_CONCURRENCY", 10)
+    requests = _lease_due(now, job_ids)
+    if not requests:
+        return 0
+    responses = asyncio.run(_poll_all([request.job_id for request in requests], concurrency))
+    for request, response in zip(requests, responses):
+        try:
+            _save_response(request.pk, response, now)
+        except Exception as e:
+            logger.error(f"Error refreshing request {request.job_id}: {e}")
+    return len(requests)
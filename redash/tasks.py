@@ -1,6 +1,9 @@
 import logging
+from django.utils import timezone
 from config.celery import app
-from redash.models import RedashSQLs, RedashDashboard, RedashRequests
+from redash.models import RedashRequests
+from redash.dispatch import claim_due_dashboards, claim_due_sqls
+from redash.poller import refresh_pending
 
 logger = logging.getLogger(__name__)
 
@@ -8,10 +11,11 @@ logger = logging.getLogger(__name__)
 def start_redash_dashboards():
     """
     Запускает запросы дашбордов в Редаше по crontab.
+    Дашборды захватываются через redash.dispatch, поэтому пересекающиеся запуски задачи не дублируют запросы.
     """
-    for dashboard in RedashDashboard.objects.filter(is_active=True).all():
+    for dashboard in claim_due_dashboards():
         try:
-            dashboard.start_query_by_crontab()
+            dashboard.start_query()
         except Exception as e:
             logger.error(f"Error starting dashboard {dashboard.id}: {e}")
 
@@ -19,17 +23,33 @@ def start_redash_dashboards():
 def start_redash_sqls():
     """
     Запускает запросы SQL в Редаше по crontab.
+    Запросы захватываются через redash.dispatch, поэтому пересекающиеся запуски задачи не дублируют запросы.
     """
-    for sql in RedashSQLs.objects.filter(is_active=True).all():
+    for sql in claim_due_sqls():
         try:
-            sql.start_query_by_crontab()
+            sql.start_query()
         except Exception as e:
             logger.error(f"Error starting query {sql.uuid}: {e}")
 
 @app.task
 def refresh_all_requests():
-    for request in RedashRequests.objects.filter(status__is_final=False).all():
-        try:
-            request.refresh()
-        except Exception as e:
-            logger.error(f"Error refreshing request {request.job_id}: {e}")
+    """
+    Одновременно опрашивает незавершённые запросы в Редаше, время опроса которых наступило (redash.poller).
+    Страховка для джобов, цепочка poll_redash_request которых потерялась.
+    """
+    return refresh_pending()
+
+@app.task
+def poll_redash_request(job_id: str):
+    """
+    Опрашивает один джоб Редаша и, пока он не завершён, ставит себя снова на его next_poll_at.
+    """
+    refresh_pending(job_ids=[job_id])
+    next_poll_at = (
+        RedashRequests.objects.filter(job_id=job_id, status__is_final=False)
+        .values_list("next_poll_at", flat=True)
+        .first()
+    )
+    if next_poll_at is not None:
+        countdown = (next_poll_at - timezone.now()).total_seconds()
+        poll_redash_request.apply_async(args=[job_id], countdown=max(countdown, 0))
@@ -0,0 +1,61 @@
+"""
+Захват готовых к запуску строк расписания так, чтобы каждую строку обработал ровно один воркер.
+
+- PostgreSQL (и другие БД с SKIP LOCKED): SELECT ... FOR UPDATE SKIP LOCKED — строки,
+  заблокированные параллельной транзакцией, просто пропускаются.
+- SQLite: аренда через колонки lease_token / lease_until. Условный UPDATE проставляет
+  токен только строкам без действующей аренды, затем выбираются строки с нашим токеном.
+
+Функции нужно вызывать внутри transaction.atomic(); аренда снимается тем же bulk_update,
+который сдвигает start_at (см. LEASE_FIELDS и release_lease).
+"""
+import uuid
+import logging
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+
+logger = logging.getLogger(__name__)
+
+# Время аренды строки. Если воркер упал, не дойдя до release_lease,
+# строка снова станет доступной по истечении аренды.
+LEASE_SECONDS = 300
+
+# Поля аренды, которые нужно добавить в bulk_update вместе с start_at
+LEASE_FIELDS = ["lease_token", "lease_until"]
+
+
+def supports_skip_locked(using: str = "default") -> bool:
+    """Поддерживает ли БД SELECT ... FOR UPDATE SKIP LOCKED."""
+    return connections[using].features.has_select_for_update_skip_locked
+
+
+def claim_due(queryset: QuerySet, now, lease_seconds: int = LEASE_SECONDS) -> list:
+    """
+    Захватывает строки queryset для текущего воркера и возвращает их списком.
+    Строки, уже захваченные другим воркером, в результат не попадают.
+
+    Args:
+        queryset: выборка готовых к запуску строк (модель должна иметь поля lease_token, lease_until)
+        now: текущее время
+        lease_seconds: время аренды строки для БД без SKIP LOCKED
+    """
+    if supports_skip_locked(queryset.db):
+        # of=("self",) — блокируем только строки расписания, а не подтянутые через select_related
+        # (FOR UPDATE нельзя применить к nullable-стороне LEFT JOIN в PostgreSQL).
+        return list(queryset.select_for_update(skip_locked=True, of=("self",)))
+
+    token = uuid.uuid4()
+    claimed = queryset.filter(
+        Q(lease_until__isnull=True) | Q(lease_until__lte=now)
+    ).update(lease_token=token, lease_until=now + timedelta(seconds=lease_seconds))
+    if not claimed:
+        return []
+    return list(queryset.filter(lease_token=token))
+
+
+def release_lease(obj) -> None:
+    """Снимает аренду с объекта (сохраняется вместе с start_at через bulk_update)."""
+    obj.lease_token = None
+    obj.lease_until = None
@@ -0,0 +1,264 @@
+"""
+Планировщик на min-heap вместо поминутного опроса таблиц расписаний.
+
+Процесс (manage.py run_scheduler) один раз загружает все активные элементы расписаний в кучу
+по start_at, спит ровно до ближайшего запуска и ставит в очередь задачу отправки нужного домена.
+Изменения расписаний приходят через Redis pub/sub: post_save/post_delete моделей и диспетчеры
+(после bulk_update start_at) публикуют (домен, pk) в канал SCHEDULER_CHANNEL.
+
+Сама отправка выполняется существующими задачами Celery, которые захватывают строки через
+utils.claim (check_list.dispatch, lighthouse.dispatch, redash.dispatch), поэтому планировщик можно
+запускать параллельно с beat — дублей не будет.
+
+Процесс живёт долго, поэтому на каждом тике закрывает устаревшие соединения с БД
+(close_old_connections), как это делает Django между запросами.
+"""
+import heapq
+import json
+import logging
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.apps import apps
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from celery import current_app
+
+from config.utils.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_CHANNEL = "auto_check_list:scheduler"
+
+# Максимальный сон без сообщений: раз в это время планировщик просыпается и проверяет подписку
+MAX_SLEEP_SECONDS = 60
+# Через сколько перепроверить элемент после постановки задачи отправки
+# (если задача ещё не сдвинула start_at или упала — элемент будет отправлен повторно через claim)
+RECHECK_SECONDS = 30
+# Полная перезагрузка кучи из БД на случай потерянных сообщений pub/sub
+RESYNC_SECONDS = 600
+
+
+@dataclass(frozen=True)
+class ScheduleDomain:
+    """Таблица расписания и задача Celery, которая отправляет её готовые элементы."""
+
+    name: str
+    model_label: str
+    task_name: str
+    active_filter: dict = field(default_factory=dict)
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def active_queryset(self):
+        return self.model._default_manager.filter(**self.active_filter)
+
+
+DOMAINS: dict[str, ScheduleDomain] = {
+    domain.name: domain
+    for domain in (
+        ScheduleDomain(
+            name="check_list",
+            model_label="check_list.CheckListItem",
+            task_name="check_list.tasks.start_send_dashboard_notification",
+            active_filter={"is_active": True},
+        ),
+        ScheduleDomain(
+            name="lighthouse",
+            model_label="lighthouse.CheckListItem",
+            task_name="lighthouse.tasks.start_lighthouse_checks",
+            active_filter={"is_active": True, "source__is_active": True},
+        ),
+        ScheduleDomain(
+            name="redash_dashboards",
+            model_label="redash.RedashDashboard",
+            task_name="redash.tasks.start_redash_dashboards",
+            active_filter={"is_active": True},
+        ),
+        ScheduleDomain(
+            name="redash_sqls",
+            model_label="redash.RedashSQLs",
+            task_name="redash.tasks.start_redash_sqls",
+            active_filter={"is_active": True},
+        ),
+    )
+}
+
+
+def publish_changes(domain: str, pks) -> None:
+    """
+    Публикует изменение элементов расписания в канал планировщика.
+    Ошибки Redis не пробрасываются: планировщик всё равно подхватит изменения при перезагрузке.
+    """
+    pks = [str(pk) for pk in pks]
+    if not pks:
+        return
+    try:
+        get_redis().publish(SCHEDULER_CHANNEL, json.dumps({"domain": domain, "pks": pks}))
+    except Exception as e:
+        logger.warning("Failed to publish scheduler change for %s: %s", domain, e)
+
+
+def notify_changed(domain: str, pks) -> None:
+    """Публикует изменение после коммита текущей транзакции."""
+    pks = list(pks)
+    transaction.on_commit(lambda: publish_changes(domain, pks))
+
+
+def connect_signals() -> None:
+    """Подключает публикацию изменений к post_save/post_delete моделей расписаний."""
+    for domain in DOMAINS.values():
+        def handler(sender, instance, _domain=domain.name, **kwargs):
+            notify_changed(_domain, [instance.pk])
+
+        post_save.connect(handler, sender=domain.model, weak=False, dispatch_uid=f"scheduler_save_{domain.name}")
+        post_delete.connect(handler, sender=domain.model, weak=False, dispatch_uid=f"scheduler_delete_{domain.name}")
+
+    # Активность источника Lighthouse влияет на выборку его элементов расписания
+    def source_handler(sender, instance, **kwargs):
+        notify_changed("lighthouse", instance.checklist_items.values_list("pk", flat=True))
+
+    post_save.connect(
+        source_handler,
+        sender=apps.get_model("lighthouse.Source"),
+        weak=False,
+        dispatch_uid="scheduler_save_lighthouse_source",
+    )
+
+
+class HeapScheduler:
+    """
+    Куча (start_at, seq, домен, pk). Устаревшие записи не удаляются из кучи,
+    а пропускаются при извлечении: актуальное время хранится в self._scheduled.
+    """
+
+    def __init__(self, domains: dict[str, ScheduleDomain] | None = None):
+        self.domains = domains or DOMAINS
+        self._heap: list[tuple[datetime, int, str, str]] = []
+        self._scheduled: dict[tuple[str, str], datetime] = {}
+        self._seq = itertools.count()
+        self._last_resync: datetime | None = None
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def schedule(self, domain: str, pk: str, when: datetime) -> None:
+        key = (domain, pk)
+        if self._scheduled.get(key) == when:
+            return
+        self._scheduled[key] = when
+        heapq.heappush(self._heap, (when, next(self._seq), domain, pk))
+
+    def unschedule(self, domain: str, pk: str) -> None:
+        self._scheduled.pop((domain, pk), None)
+
+    def next_wakeup(self) -> datetime | None:
+        while self._heap:
+            when, _, domain, pk = self._heap[0]
+            if self._scheduled.get((domain, pk)) == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime) -> dict[str, list[str]]:
+        """Извлекает из кучи все элементы со временем <= now, сгруппированные по доменам."""
+        due: dict[str, list[str]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            when, _, domain, pk = heapq.heappop(self._heap)
+            if self._scheduled.get((domain, pk)) != when:
+                continue
+            del self._scheduled[(domain, pk)]
+            due.setdefault(domain, []).append(pk)
+        return due
+
+    def load_all(self) -> None:
+        """Полностью перезагружает кучу из БД (по одному запросу на домен)."""
+        self._heap = []
+        self._scheduled = {}
+        for name, domain in self.domains.items():
+            for pk, start_at in domain.active_queryset().values_list("pk", "start_at").iterator():
+                self.schedule(name, str(pk), start_at)
+        self._last_resync = timezone.now()
+        logger.info("Scheduler loaded %s item(s)", len(self))
+
+    def reload(self, domain: str, pks: list[str]) -> None:
+        """Перечитывает из БД start_at указанных элементов (один запрос)."""
+        if domain not in self.domains:
+            return
+        rows = dict(
+            (str(pk), start_at)
+            for pk, start_at in self.domains[domain].active_queryset()
+            .filter(pk__in=pks)
+            .values_list("pk", "start_at")
+        )
+        for pk in pks:
+            if pk in rows:
+                self.schedule(domain, pk, rows[pk])
+            else:
+                # Элемент удалён или деактивирован
+                self.unschedule(domain, pk)
+
+    def dispatch_due(self, now: datetime) -> list[str]:
+        """
+        Ставит в очередь задачи отправки для доменов, у которых наступило время запуска.
+        Возвращает список доменов, для которых была поставлена задача.
+        """
+        dispatched = []
+        for domain, pks in self.pop_due(now).items():
+            rows = dict(
+                (str(pk), start_at)
+                for pk, start_at in self.domains[domain].active_queryset()
+                .filter(pk__in=pks)
+                .values_list("pk", "start_at")
+            )
+            has_due = False
+            for pk in pks:
+                start_at = rows.get(pk)
+                if start_at is None:
+                    continue
+                if start_at <= now:
+                    has_due = True
+                    # Перепроверяем позже: обычно раньше придёт сообщение диспетчера с новым start_at
+                    self.schedule(domain, pk, now + timedelta(seconds=RECHECK_SECONDS))
+                else:
+                    self.schedule(domain, pk, start_at)
+            if has_due:
+                current_app.send_task(self.domains[domain].task_name)
+                dispatched.append(domain)
+        return dispatched
+
+    def handle_message(self, message: dict) -> None:
+        try:
+            payload = json.loads(message["data"])
+            self.reload(payload["domain"], [str(pk) for pk in payload["pks"]])
+        except Exception as e:
+            logger.warning("Invalid scheduler message %r: %s", message.get("data"), e)
+
+    def sleep_seconds(self, now: datetime) -> float:
+        next_wakeup = self.next_wakeup()
+        if next_wakeup is None:
+            return MAX_SLEEP_SECONDS
+        return min(max((next_wakeup - now).total_seconds(), 0), MAX_SLEEP_SECONDS)
+
+    def run_forever(self) -> None:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(SCHEDULER_CHANNEL)
+        self.load_all()
+        while True:
+            close_old_connections()
+            now = timezone.now()
+            if (now - self._last_resync).total_seconds() >= RESYNC_SECONDS:
+                self.load_all()
+            dispatched = self.dispatch_due(now)
+            if dispatched:
+                logger.info("Scheduler dispatched: %s", ", ".join(dispatched))
+
+            message = pubsub.get_message(timeout=self.sleep_seconds(timezone.now()))
+            while message:
+                if message.get("type") == "message":
+                    self.handle_message(message)
+                message = pubsub.get_message(timeout=0)